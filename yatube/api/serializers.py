@@ -0,0 +1,37 @@
+"""Сериализация в словари без слоя полей: данные берутся из колонок,
+которые уже загрузил PostQuerySet.for_feed().
+"""
+
+
+def serialize_post(post):
+    if post.feed_image_url:
+        image = post.feed_image_url
+    elif post.image:
+        image = post.image.url
+    else:
+        image = None
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': post.author.username if post.author_id else None,
+        'group': post.group.slug if post.group_id else None,
+        'image': image,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username if comment.author_id else None,
+        'text': comment.text,
+        'created': comment.created,
+    }
+
+
+def serialize_page(page, serializer=serialize_post):
+    return {
+        'results': [serializer(obj) for obj in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
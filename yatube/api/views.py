@@ -0,0 +1,78 @@
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.vary import vary_on_cookie
+
+from posts.conditional import conditional
+from posts.models import Group, Post, User
+from posts.paginators import CursorPaginator
+from posts.timeline import TimelinePaginator, timeline_posts
+from posts.views import get_comments_page
+
+from .serializers import serialize_comment, serialize_page, serialize_post
+
+
+def api_response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        encoder=DjangoJSONEncoder,
+        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False},
+    )
+
+
+def api_login_required(view):
+    """Вместо редиректа на форму входа отвечает 401."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return api_response(
+                {'detail': 'Требуется авторизация'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def feed_page(request, queryset, paginator_class=CursorPaginator):
+    paginator = paginator_class(queryset, settings.PAGE_NUM)
+    page = paginator.page_by_cursor(request.GET.get('cursor'))
+    return api_response(serialize_page(page))
+
+
+@conditional()
+def index(request):
+    return feed_page(request, Post.objects.for_feed())
+
+
+@conditional()
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return feed_page(request, Post.objects.for_feed().filter(group=group))
+
+
+@conditional()
+def profile(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed_page(request, Post.objects.for_feed().filter(author=author))
+
+
+@api_login_required
+@vary_on_cookie
+@conditional(timeline=True)
+def follow_index(request):
+    return feed_page(
+        request,
+        timeline_posts(request.user),
+        paginator_class=partial(TimelinePaginator, user=request.user)
+    )
+
+
+@conditional()
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    comments = get_comments_page(post.pk, request.GET.get('comments'))
+    data = serialize_post(post)
+    data['comments'] = serialize_page(comments, serialize_comment)
+    return api_response(data)
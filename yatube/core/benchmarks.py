@@ -0,0 +1,161 @@
+"""Общие помощники для команд-бенчмарков: временная БД, наполнение
+данными и замер запросов, памяти и созданных моделей.
+"""
+import json
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_init
+from django.test.utils import CaptureQueriesContext
+
+User = get_user_model()
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+@contextmanager
+def benchmark_database(test_name=None):
+    """Временная тестовая БД, чтобы замеры не трогали рабочие данные.
+
+    test_name задаёт файл БД: SQLite в памяти не годится, когда
+    запросы идут из нескольких потоков сервера.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if test_name:
+        test_settings['NAME'] = test_name
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+
+
+def seed(users=20, groups=5, posts=500, comments=1000, follows=100,
+         seed_value=0):
+    """Наполняет базу через bulk_create и досчитывает производные таблицы.
+
+    Возвращает словарь с созданными пользователями, группами и постами.
+    """
+    from posts import search, timeline
+    from posts.models import Comment, Follow, Group, Post
+
+    rnd = random.Random(seed_value)
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create(
+        User(
+            username=f'user{i}',
+            first_name='Имя',
+            last_name=f'Фамилия{i}',
+            password=password,
+        )
+        for i in range(users)
+    )
+    user_list = list(User.objects.filter(username__startswith='user'))
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'group-{i}', description='Описание')
+        for i in range(groups)
+    )
+    group_list = list(Group.objects.all())
+    Post.objects.bulk_create(
+        (
+            Post(
+                author=rnd.choice(user_list),
+                group=rnd.choice(group_list + [None]),
+                text=f'Текст поста {i} ' * 10,
+            )
+            for i in range(posts)
+        ),
+        batch_size=500
+    )
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    Comment.objects.bulk_create(
+        (
+            Comment(
+                post_id=rnd.choice(post_ids),
+                author=rnd.choice(user_list),
+                text=f'Комментарий {i}',
+            )
+            for i in range(comments)
+        ),
+        batch_size=500
+    )
+    pairs = set()
+    while len(pairs) < min(follows, users * (users - 1)):
+        user, author = rnd.sample(user_list, 2)
+        pairs.add((user.pk, author.pk))
+    Follow.objects.bulk_create(
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in pairs
+    )
+    call_command('rebuild_author_stats', stdout=StringIO())
+    timeline.fill(author_id for _, author_id in pairs)
+    search.reindex()
+    return {
+        'users': user_list,
+        'groups': group_list,
+        'post_ids': post_ids,
+    }
+
+
+@contextmanager
+def count_model_instances():
+    """Считает экземпляры моделей, созданные внутри блока."""
+    counter = {'instances': 0}
+
+    def count(sender, **kwargs):
+        counter['instances'] += 1
+
+    post_init.connect(count, weak=False)
+    try:
+        yield counter
+    finally:
+        post_init.disconnect(count)
+
+
+def measure(func, repeat=10):
+    """Средние значения на один вызов func: время, запросы, модели и
+    пиковая память Python. Время меряется отдельным проходом, без
+    накладных расходов tracemalloc.
+    """
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    wall = time.perf_counter() - started
+    queries = instances = peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as captured:
+            with count_model_instances() as counter:
+                func()
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        queries += len(captured)
+        instances += counter['instances']
+    return {
+        'ms': round(wall / repeat * 1000, 3),
+        'queries': queries / repeat,
+        'model_instances': instances / repeat,
+        'peak_kib': round(peak / repeat / 1024, 1),
+    }
+
+
+def write_report(command, report, output=None):
+    """Печатает отчёт в JSON или сохраняет его в файл."""
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        command.stdout.write(text)
@@ -0,0 +1,258 @@
+"""Кэш в файле SQLite в режиме WAL, общий для всех процессов на хосте.
+
+В отличие от LocMemCache записи и сброс поколений видны всем воркерам
+gunicorn сразу. Читатели в WAL не блокируют писателя, файл
+отображается в память через mmap. Число записей и их суммарный размер
+ведут триггеры в однострочной таблице cache_stats, поэтому проверка
+лимитов после записи — чтение одной строки; при превышении сначала
+удаляются просроченные записи, затем давно не читавшиеся (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL, size INTEGER NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    'id INTEGER PRIMARY KEY CHECK (id = 0), '
+    'entries INTEGER NOT NULL, size INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN '
+    'UPDATE cache_stats SET entries = entries + 1, size = size + NEW.size; '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN '
+    'UPDATE cache_stats SET entries = entries - 1, size = size - OLD.size; '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache '
+    'BEGIN UPDATE cache_stats SET size = size - OLD.size + NEW.size; END',
+)
+
+UPSERT = (
+    'INSERT INTO cache (key, value, expires, accessed, size) '
+    'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+    'value = excluded.value, expires = excluded.expires, '
+    'accessed = excluded.accessed, size = excluded.size'
+)
+
+# Время последнего чтения обновляется не чаще раза в минуту: для
+# вытеснения этой точности хватает, а чтения почти не становятся записями.
+ACCESS_RESOLUTION = 60.0
+
+
+class SQLiteCache(BaseCache):
+    """Бэкенд django.core.cache с LOCATION — путём к файлу базы.
+
+    OPTIONS: MAX_ENTRIES и CULL_FREQUENCY как у встроенных бэкендов,
+    MAX_SIZE — предел суммарного размера значений в байтах,
+    MMAP_SIZE — размер отображаемой в память части файла.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = options.get('MAX_SIZE')
+        self._mmap_size = options.get('MMAP_SIZE', 256 * 1024 * 1024)
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение своё у каждого потока и каждого процесса: после
+        # fork унаследованным соединением SQLite пользоваться нельзя.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=30, isolation_level=None,
+            check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute(f'PRAGMA mmap_size = {int(self._mmap_size)}')
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires, now):
+        return expires is None or expires > now
+
+    def _touch_access(self, db, keys, now):
+        db.execute(
+            'UPDATE cache SET accessed = ? WHERE key IN ({}) '
+            'AND accessed < ?'.format(', '.join('?' * len(keys))),
+            [now, *keys, now - ACCESS_RESOLUTION]
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        db = self._connection()
+        row = db.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            [key]
+        ).fetchone()
+        now = time.time()
+        if row is None or not self._alive(row[1], now):
+            return default
+        if now - row[2] > ACCESS_RESOLUTION:
+            self._touch_access(db, [key], now)
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        db = self._connection()
+        rows = db.execute(
+            'SELECT key, value, expires, accessed FROM cache '
+            'WHERE key IN ({})'.format(', '.join('?' * len(made))),
+            list(made)
+        ).fetchall()
+        now = time.time()
+        found = {}
+        stale = []
+        for key, value, expires, accessed in rows:
+            if self._alive(expires, now):
+                found[made[key]] = pickle.loads(value)
+                if now - accessed > ACCESS_RESOLUTION:
+                    stale.append(key)
+        if stale:
+            self._touch_access(db, stale, now)
+        return found
+
+    def _row(self, key, value, timeout, now):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return [key, value, self.get_backend_timeout(timeout), now,
+                len(value)]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._connection()
+        db.execute(UPSERT, self._row(key, value, timeout, time.time()))
+        self._cull(db)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [
+            self._row(self._key(key, version), value, timeout, now)
+            for key, value in data.items()
+        ]
+        db = self._connection()
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.executemany(UPSERT, rows)
+        self._cull(db)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        db = self._connection()
+        # Просроченная запись считается отсутствующей и перезаписывается.
+        cursor = db.execute(
+            UPSERT + ' WHERE cache.expires IS NOT NULL '
+            'AND cache.expires <= ?',
+            self._row(key, value, timeout, now) + [now]
+        )
+        added = cursor.rowcount > 0
+        if added:
+            self._cull(db)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, now]
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        made = self._key(key, version)
+        db = self._connection()
+        # BEGIN IMMEDIATE берёт блокировку записи до чтения: два процесса
+        # не увеличат одно и то же старое значение.
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', [made]
+            ).fetchone()
+            if row is None or not self._alive(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                [data, len(data), made]
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            'SELECT expires FROM cache WHERE key = ?', [key]
+        ).fetchone()
+        return row is not None and self._alive(row[0], time.time())
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        cursor = self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', [key])
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._connection().execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(keys))),
+                keys
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _over_limit(self, db):
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_stats').fetchone()
+        return entries > self._max_entries or (
+            self._max_size is not None and size > self._max_size)
+
+    def _cull(self, db):
+        if not self._over_limit(db):
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            [time.time()]
+        )
+        while self._over_limit(db):
+            entries = db.execute(
+                'SELECT entries FROM cache_stats').fetchone()[0]
+            if self._cull_frequency == 0:
+                db.execute('DELETE FROM cache')
+                return
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                [max(1, entries // self._cull_frequency)]
+            )
@@ -0,0 +1,135 @@
+"""Хеширование паролей в ограниченном пуле потоков.
+
+PBKDF2 из hashlib, argon2-cffi и bcrypt отпускают GIL на время
+вычисления, поэтому потоки пула считают хеши параллельно, а их число
+ограничивает, сколько ядер одновременно заняты паролями. Сверх
+PASSWORD_HASHING_WORKERS своей очереди ждут не больше
+PASSWORD_HASHING_QUEUE хешей; следующий сразу получает HashingBusy,
+и PasswordHashingMiddleware отвечает 503, не занимая воркер ожиданием.
+
+Хешеры — подклассы встроенных с теми же именами алгоритмов, так что
+старые хеши проверяются как прежде. Параметры берутся из
+PASSWORD_HASHER_OPTIONS; если они не совпадают с параметрами хеша или
+хеш сделан не предпочтительным хешером, Django перехеширует пароль
+при следующем удачном входе.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from core import metrics
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+class HashingBusy(Exception):
+    """Очередь хеширования паролей заполнена."""
+
+
+class HashingPool:
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hashing')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, func, *args, **kwargs):
+        if not self.slots.acquire(blocking=False):
+            metrics.PASSWORD_HASHES.inc(outcome='rejected')
+            raise HashingBusy
+        try:
+            result = self.executor.submit(
+                _call_inside, func, args, kwargs).result()
+        except Exception:
+            metrics.PASSWORD_HASHES.inc(outcome='failed')
+            raise
+        finally:
+            self.slots.release()
+        metrics.PASSWORD_HASHES.inc(outcome='done')
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def _call_inside(func, args, kwargs):
+    # verify() у PBKDF2 и bcrypt вызывает encode(): внутри потока пула
+    # он считается на месте, иначе поток ждал бы сам себя.
+    _local.inside = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _local.inside = False
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(
+                settings.PASSWORD_HASHING_WORKERS,
+                settings.PASSWORD_HASHING_QUEUE
+            )
+        return _pool
+
+
+def run(func, *args, **kwargs):
+    """Выполняет func в пуле хеширования и ждёт результата.
+
+    При PASSWORD_HASHING_WORKERS = 0 func выполняется в текущем потоке.
+    """
+    if not settings.PASSWORD_HASHING_WORKERS or getattr(
+            _local, 'inside', False):
+        return func(*args, **kwargs)
+    return get_pool().run(func, *args, **kwargs)
+
+
+@receiver(setting_changed)
+def reset(setting, **kwargs):
+    global _pool
+    if setting in ('PASSWORD_HASHING_WORKERS', 'PASSWORD_HASHING_QUEUE'):
+        with _pool_lock:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = None
+    elif setting == 'PASSWORD_HASHER_OPTIONS':
+        hashers.get_hashers.cache_clear()
+        hashers.get_hashers_by_algorithm.cache_clear()
+
+
+class PooledHasher:
+    """Считает хеши в пуле, параметры берёт из PASSWORD_HASHER_OPTIONS."""
+
+    def __init__(self):
+        options = settings.PASSWORD_HASHER_OPTIONS.get(self.algorithm, {})
+        for name, value in options.items():
+            setattr(self, name, value)
+
+    def encode(self, *args, **kwargs):
+        return run(super().encode, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return run(super().verify, password, encoded)
+
+
+class PBKDF2PasswordHasher(PooledHasher, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class PBKDF2SHA1PasswordHasher(
+        PooledHasher, hashers.PBKDF2SHA1PasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(PooledHasher, hashers.Argon2PasswordHasher):
+    pass
+
+
+class BCryptSHA256PasswordHasher(
+        PooledHasher, hashers.BCryptSHA256PasswordHasher):
+    pass
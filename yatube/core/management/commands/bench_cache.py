@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import write_report
+from core.cache import SQLiteCache
+
+
+def make_backends(directory, max_entries):
+    params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    return {
+        'locmem': lambda: LocMemCache('bench', params),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'files'), params),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), params),
+    }
+
+
+def per_op_us(func, ops):
+    started = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    return round((time.perf_counter() - started) / ops * 1e6, 2)
+
+
+def single_process(cache, ops, value):
+    cache.clear()
+    cache.set('counter', 0)
+    return {
+        'set_us': per_op_us(lambda i: cache.set(f'key{i}', value), ops),
+        'get_hit_us': per_op_us(lambda i: cache.get(f'key{i}'), ops),
+        'get_miss_us': per_op_us(lambda i: cache.get(f'miss{i}'), ops),
+        'incr_us': per_op_us(lambda i: cache.incr('counter'), ops),
+    }
+
+
+def worker(factory, index, workers, ops, value, barrier, results):
+    cache = factory()
+    for i in range(ops):
+        cache.set(f'w{index}:{i}', value)
+    barrier.wait()
+    neighbour = (index + 1) % workers
+    started = time.perf_counter()
+    hits = sum(
+        cache.get(f'w{neighbour}:{i}') is not None for i in range(ops))
+    elapsed = time.perf_counter() - started
+    barrier.wait()
+    for _ in range(ops):
+        try:
+            cache.incr('shared_counter')
+        except ValueError:
+            cache.set('shared_counter', 1)
+    results.put((hits, elapsed))
+
+
+def multi_process(factory, workers, ops, value):
+    """Каждый процесс пишет свои ключи и читает ключи соседа; затем все
+    увеличивают общий счётчик. Доля попаданий показывает, видны ли
+    записи другим процессам, потерянные инкременты — атомарность incr.
+    """
+    cache = factory()
+    cache.clear()
+    cache.set('shared_counter', 0)
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(factory, index, workers, ops, value, barrier, results)
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    hits = sum(hits for hits, _ in collected)
+    elapsed = max(elapsed for _, elapsed in collected)
+    counted = cache.get('shared_counter') or 0
+    return {
+        'shared_hit_rate': round(hits / (workers * ops), 3),
+        'shared_reads_per_s': round(workers * ops / elapsed),
+        'lost_increments': workers * ops - counted,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает SQLiteCache с LocMemCache и FileBasedCache: '
+            'задержки операций в одном процессе, видимость записей и '
+            'атомарность incr между процессами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--value-size',
+            type=int,
+            default=16 * 1024,
+            help='Размер значения в байтах, по умолчанию как у фрагмента '
+                 'ленты.'
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        ops, workers = options['ops'], options['workers']
+        value = 'x' * options['value_size']
+        directory = tempfile.mkdtemp(prefix='bench_cache_')
+        report = {}
+        try:
+            backends = make_backends(directory, ops * (workers + 1) * 2)
+            for name, factory in backends.items():
+                stats = single_process(factory(), ops, value)
+                stats.update(multi_process(factory, workers, ops, value))
+                report[name] = stats
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        write_report(self, report, options['output'])
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import benchmark_database, measure, seed, write_report
+
+
+def throughput(func, pairs):
+    started = time.perf_counter()
+    func(pairs)
+    elapsed = time.perf_counter() - started
+    return {
+        'pairs': len(pairs),
+        'seconds': round(elapsed, 3),
+        'pairs_per_second': round(len(pairs) / elapsed, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Замеряет одиночные подписку и отписку и пропускную '
+            'способность массовых подписок против подписок по одной.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        from posts import follows
+
+        with benchmark_database():
+            data = seed(
+                users=options['users'], posts=options['posts'],
+                comments=0, follows=0)
+            users = data['users']
+            reader, author = users[0], users[1]
+
+            def round_trip():
+                follows.follow(reader, author)
+                follows.unfollow(reader, author)
+            report = {'follow_unfollow': measure(
+                round_trip, repeat=options['repeat'])}
+
+            half = len(users) // 2
+            one_by_one = [
+                (user, other) for user in users[:half]
+                for other in users[half:half + 10]
+            ]
+            report['follow_one_by_one'] = throughput(
+                lambda pairs: [follows.follow(*pair) for pair in pairs],
+                one_by_one
+            )
+            bulk = [
+                (user.pk, other.pk) for user in users[half:]
+                for other in users[:half]
+            ]
+            report['follow_many'] = throughput(follows.follow_many, bulk)
+            report['unfollow_many'] = throughput(follows.unfollow_many, bulk)
+        write_report(self, report, options['output'])
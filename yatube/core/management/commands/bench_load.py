@@ -0,0 +1,305 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from importlib import import_module
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+)
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer, WSGIRequestHandler
+)
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from core.benchmarks import benchmark_database, seed, write_report
+from posts.models import Post
+
+QUERIES_HEADER = 'X-Bench-Queries'
+
+
+class QueryCounter:
+    """Считает SQL-запросы каждого запроса к серверу и отдаёт их число
+    клиенту в заголовке ответа.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def wrap(self, app):
+        def counted(environ, start_response):
+            self.local.count = 0
+
+            def start(status, headers, exc_info=None):
+                headers.append((QUERIES_HEADER, str(self.local.count)))
+                return start_response(status, headers, exc_info)
+            return app(environ, start)
+        return counted
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def login_cookie(user):
+    """Cookie сессии вошедшего пользователя без запроса к форме входа."""
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store[SESSION_KEY] = str(user.pk)
+    store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    store.save()
+    return f'{settings.SESSION_COOKIE_NAME}={store.session_key}'
+
+
+def percentile(ordered, fraction):
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return round(ordered[index] * 1000, 2)
+
+
+def summarize(results, wall):
+    latencies = sorted(latency for latency, _, _ in results)
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'rps': round(len(results) / wall, 1),
+        'queries_per_request': round(
+            sum(queries for _, _, queries in results) / len(results), 2),
+        'statuses': statuses,
+    }
+
+
+@contextmanager
+def serve():
+    """Поднимает приложение на локальном многопоточном WSGI-сервере
+    со счётчиком запросов и отдаёт его адрес.
+    """
+    counter = QueryCounter()
+    connection_created.connect(counter.install)
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+    server.set_app(counter.wrap(get_wsgi_application()))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%d' % server.server_port
+    finally:
+        server.shutdown()
+        server.server_close()
+        connection_created.disconnect(counter.install)
+
+
+def fetch(opener, base_url, build, i):
+    """Выполняет i-й запрос адреса; (время, статус, SQL-запросы)."""
+    method, path, headers, body = build(i)
+    started = time.perf_counter()
+    try:
+        response = opener.open(Request(
+            base_url + path, data=body, headers=headers, method=method))
+    except HTTPError as error:
+        response = error
+    response.read()
+    elapsed = time.perf_counter() - started
+    status = getattr(response, 'status', None) or response.code
+    queries = int(response.headers.get(QUERIES_HEADER) or 0)
+    return elapsed, status, queries
+
+
+def load(pool, base_url, build, requests):
+    """Отправляет requests запросов через пул; результаты и общее время."""
+    opener = build_opener(NoRedirect)
+    started = time.perf_counter()
+    results = list(pool.map(
+        lambda i: fetch(opener, base_url, build, i), range(requests)))
+    return results, time.perf_counter() - started
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон: наполняет временную БД, поднимает '
+            'локальный WSGI-сервер и параллельно опрашивает все адреса '
+            'posts, users и about. Отчёт в JSON: p50/p95/p99, '
+            'пропускная способность и SQL-запросы на запрос.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=500)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждый адрес.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        seed_options = {
+            name: options[name]
+            for name in ('users', 'groups', 'posts', 'comments', 'follows')
+        }
+        directory = tempfile.mkdtemp(prefix='bench_load_')
+        database = os.path.join(directory, 'bench.sqlite3')
+        with benchmark_database(test_name=database):
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode = WAL')
+            data = seed(**seed_options)
+            cache.clear()
+            targets = self.targets(data, options['requests'])
+            with serve() as base_url:
+                report = self.run(base_url, targets, options)
+        os.rmdir(directory)
+        report['seed'] = seed_options
+        report['commit'] = git_commit()
+        write_report(self, report, options['output'])
+
+    def targets(self, data, requests):
+        """Адреса прогона: функция от номера запроса возвращает метод,
+        путь, заголовки и тело. Сессии создаются заранее, вне замера.
+        """
+        users = data['users']
+        cookies = [login_cookie(user) for user in users]
+        csrf_token = get_random_string(64)
+        author = users[0]
+        post_id = Post.objects.filter(author=author).values_list(
+            'pk', flat=True).first()
+        group = data['groups'][0].slug
+        logout_cookies = [
+            login_cookie(users[i % len(users)]) for i in range(requests)]
+
+        def page(path, viewer='anon'):
+            def build(i):
+                headers = {}
+                if viewer == 'auth':
+                    headers['Cookie'] = cookies[i % len(cookies)]
+                return 'GET', path, headers, None
+            return build
+
+        def as_user(path_for_author):
+            # Каждый запрос от своего пользователя к следующему по списку.
+            def build(i):
+                index = i % len(users)
+                target = users[(index + 1) % len(users)]
+                return 'GET', path_for_author(target), {
+                    'Cookie': cookies[index]}, None
+            return build
+
+        def form_headers(i):
+            return {
+                'Cookie': f'{cookies[i % len(cookies)]}; '
+                          f'{settings.CSRF_COOKIE_NAME}={csrf_token}',
+                'X-CSRFToken': csrf_token,
+            }
+
+        def comment(i):
+            return (
+                'POST', reverse('posts:add_comment', args=[post_id]),
+                form_headers(i),
+                urlencode({'text': f'Нагрузочный комментарий {i}'}).encode()
+            )
+
+        def group_follow(i):
+            return (
+                'POST', reverse('posts:group_follow', args=[group]),
+                form_headers(i), b''
+            )
+
+        def logout(i):
+            return 'GET', reverse('users:logout'), {
+                'Cookie': logout_cookies[i]}, None
+
+        targets = {}
+        for name, path in (
+            ('posts:index', reverse('posts:index')),
+            ('posts:index?page=5', reverse('posts:index') + '?page=5'),
+            ('posts:slug', reverse('posts:slug', args=[group])),
+            ('posts:profile', reverse('posts:profile', args=[author])),
+            ('posts:post_detail',
+             reverse('posts:post_detail', args=[post_id])),
+            ('posts:post_comments',
+             reverse('posts:post_comments', args=[post_id])),
+            ('posts:search',
+             reverse('posts:search') + '?' + urlencode({'q': 'текст'})),
+        ):
+            targets[f'{name} (anon)'] = page(path)
+            targets[f'{name} (auth)'] = page(path, 'auth')
+        targets.update({
+            'posts:post_create': page(
+                reverse('posts:post_create'), 'auth'),
+            'posts:post_edit': page(
+                reverse('posts:post_edit', args=[post_id]), 'auth'),
+            'posts:add_comment': comment,
+            'posts:follow_index': page(
+                reverse('posts:follow_index'), 'auth'),
+            'posts:profile_follow': as_user(lambda target: reverse(
+                'posts:profile_follow', args=[target.username])),
+            'posts:profile_unfollow': as_user(lambda target: reverse(
+                'posts:profile_unfollow', args=[target.username])),
+            'posts:group_follow': group_follow,
+            'users:signup': page(reverse('users:signup')),
+            'users:login': page(reverse('users:login')),
+            'users:logout': logout,
+            'about:author': page(reverse('about:author')),
+            'about:tech': page(reverse('about:tech')),
+        })
+        return targets
+
+    def run(self, base_url, targets, options):
+        report = {
+            'concurrency': options['concurrency'],
+            'requests_per_url': options['requests'],
+            'urls': {},
+        }
+        everything = []
+        total_wall = 0
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for name, build in targets.items():
+                results, wall = load(
+                    pool, base_url, build, options['requests'])
+                report['urls'][name] = summarize(results, wall)
+                everything += results
+                total_wall += wall
+        report['total'] = summarize(everything, total_wall)
+        return report
@@ -0,0 +1,111 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from core.benchmarks import benchmark_database, write_report
+from core.management.commands.bench_load import (
+    git_commit, load, serve, summarize
+)
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-login-password'
+
+
+def available(path):
+    """Для argon2 и bcrypt нужны сторонние пакеты."""
+    with override_settings(PASSWORD_HASHERS=[path]):
+        hasher = get_hasher()
+        if not getattr(hasher, 'library', None):
+            return True
+        try:
+            hasher._load_library()
+        except ValueError:
+            return False
+    return True
+
+
+class Command(BaseCommand):
+    help = ('Замеряет входы в секунду через форму входа для хешеров из '
+            'PASSWORD_HASHER_CLASSES, в том числе в пересчёте на ядро, и '
+            'отказы 503 при переполненной очереди хеширования.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--hasher',
+            action='append',
+            choices=sorted(settings.PASSWORD_HASHER_CLASSES),
+            help='Хешер для замера; по умолчанию все установленные.'
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        names = options['hasher'] or list(settings.PASSWORD_HASHER_CLASSES)
+        cores = min(
+            settings.PASSWORD_HASHING_WORKERS or options['concurrency'],
+            options['concurrency'],
+            os.cpu_count() or 1,
+        )
+        report = {
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'hashing_workers': settings.PASSWORD_HASHING_WORKERS,
+            'hashing_queue': settings.PASSWORD_HASHING_QUEUE,
+            'cores': cores,
+            'hashers': {},
+        }
+        directory = tempfile.mkdtemp(prefix='bench_logins_')
+        database = os.path.join(directory, 'bench.sqlite3')
+        with benchmark_database(test_name=database):
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode = WAL')
+            User.objects.bulk_create(
+                User(username=f'login{i}') for i in range(options['users']))
+            usernames = list(User.objects.values_list('username', flat=True))
+            csrf_token = get_random_string(64)
+            url = reverse('users:login')
+
+            def build(i):
+                body = urlencode({
+                    'username': usernames[i % len(usernames)],
+                    'password': PASSWORD,
+                }).encode()
+                return 'POST', url, {
+                    'Cookie': f'{settings.CSRF_COOKIE_NAME}={csrf_token}',
+                    'X-CSRFToken': csrf_token,
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                }, body
+
+            for name in names:
+                path = settings.PASSWORD_HASHER_CLASSES[name]
+                if not available(path):
+                    report['hashers'][name] = 'не установлен'
+                    continue
+                with override_settings(PASSWORD_HASHERS=[path]):
+                    User.objects.update(password=make_password(PASSWORD))
+                    with serve() as base_url, ThreadPoolExecutor(
+                        options['concurrency']
+                    ) as pool:
+                        results, wall = load(
+                            pool, base_url, build, options['requests'])
+                summary = summarize(results, wall)
+                summary['logins_per_core'] = round(
+                    summary['statuses'].get('302', 0) / wall / cores, 1)
+                report['hashers'][name] = summary
+        os.rmdir(directory)
+        report['commit'] = git_commit()
+        write_report(self, report, options['output'])
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import benchmark_database, measure, seed, write_report
+
+
+class Command(BaseCommand):
+    help = ('Замеряет первую и следующую страницы поиска по частому и '
+            'редкому слову.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        from posts import search
+
+        if not search.available():
+            raise CommandError('Поиск работает только на SQLite FTS5.')
+        with benchmark_database():
+            seed(
+                posts=options['posts'], comments=options['comments'],
+                follows=0)
+            report = {}
+            # «текст» есть в каждом посте, «комментарий» — в каждом
+            # комментарии, «777» — в нескольких документах.
+            for query in ('текст', 'комментарий', '777'):
+                _, cursor = search.search(query)
+                report[query] = {
+                    'first_page': measure(
+                        lambda: search.search(query),
+                        repeat=options['repeat']),
+                    'next_page': measure(
+                        lambda: search.search(query, cursor),
+                        repeat=options['repeat']),
+                }
+        write_report(self, report, options['output'])
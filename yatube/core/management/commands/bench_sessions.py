@@ -0,0 +1,74 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+
+from core.benchmarks import benchmark_database, seed, write_report
+from core.management.commands.bench_load import (
+    git_commit, load, login_cookie, serve, summarize
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает хранилища сессий из SESSION_BACKENDS: '
+            'пропускная способность и SQL-запросы на запрос для '
+            'follow_index под вошедшими пользователями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--backend',
+            action='append',
+            choices=sorted(settings.SESSION_BACKENDS),
+            help='Хранилище для замера; по умолчанию все.'
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        backends = options['backend'] or list(settings.SESSION_BACKENDS)
+        directory = tempfile.mkdtemp(prefix='bench_sessions_')
+        database = os.path.join(directory, 'bench.sqlite3')
+        report = {
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'backends': {},
+        }
+        with benchmark_database(test_name=database):
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode = WAL')
+            users = seed(
+                users=options['users'], posts=options['posts'],
+                comments=0, follows=options['follows'])['users']
+            url = reverse('posts:follow_index')
+            for backend in backends:
+                engine = settings.SESSION_BACKENDS[backend]
+                with override_settings(SESSION_ENGINE=engine):
+                    cache.clear()
+                    cookies = [login_cookie(user) for user in users]
+
+                    def build(i):
+                        return 'GET', url, {
+                            'Cookie': cookies[i % len(cookies)]}, None
+                    with serve() as base_url, ThreadPoolExecutor(
+                        options['concurrency']
+                    ) as pool:
+                        # Прогрев: ленты и сессии каждого пользователя
+                        # попадают в кэш до замера.
+                        load(pool, base_url, build, len(cookies))
+                        results, wall = load(
+                            pool, base_url, build, options['requests'])
+                report['backends'][backend] = summarize(results, wall)
+        os.rmdir(directory)
+        report['commit'] = git_commit()
+        write_report(self, report, options['output'])
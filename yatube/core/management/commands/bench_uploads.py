@@ -0,0 +1,60 @@
+import resource
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from core.benchmarks import measure, write_report
+from posts.forms import PostForm
+
+
+def camera_jpeg(size):
+    """JPEG, похожий на снимок с камеры: шум, высокое качество, EXIF."""
+    image = Image.effect_noise(size, 48).convert('RGB')
+    exif = Image.Exif()
+    exif[0x010f] = 'Benchmark camera'
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=95, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность и память проверки и '
+            'перекодирования картинок в PostForm.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            default=['1280x960', '4000x3000'],
+            help='Размеры тестовых снимков, например 4000x3000.'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        report = {}
+        for size in options['sizes']:
+            width, height = map(int, size.split('x'))
+            content = camera_jpeg((width, height))
+            result = {}
+
+            def upload():
+                form = PostForm(
+                    {'text': 'Бенчмарк загрузки'},
+                    files={'image': SimpleUploadedFile(
+                        'camera.jpg', content, 'image/jpeg')}
+                )
+                form.is_valid()
+                result['stored_bytes'] = form.cleaned_data['image'].size
+
+            stats = measure(upload, repeat=options['repeat'])
+            stats['input_bytes'] = len(content)
+            stats['stored_bytes'] = result['stored_bytes']
+            stats['mb_per_s'] = round(
+                len(content) / 2 ** 20 / (stats['ms'] / 1000), 2)
+            stats['max_rss_kib'] = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss
+            report[size] = stats
+        write_report(self, report, options['output'])
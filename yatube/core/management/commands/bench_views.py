@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from core.benchmarks import benchmark_database, measure, seed, write_report
+
+
+class Command(BaseCommand):
+    help = ('Замеряет запросы к БД, созданные модели, память и время '
+            'на один запрос к каждой странице постов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--cold-cache',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            data = seed(posts=options['posts'], comments=options['posts'])
+            user = data['users'][0]
+            post_id = user.posts.values_list('pk', flat=True).first()
+            author = data['users'][1].username
+            client = Client()
+            client.force_login(user)
+            pages = {
+                'index': reverse('posts:index'),
+                'index_page_5': reverse('posts:index') + '?page=5',
+                'group_posts': reverse(
+                    'posts:slug', args=[data['groups'][0].slug]),
+                'profile': reverse('posts:profile', args=[author]),
+                'post_detail': reverse(
+                    'posts:post_detail', args=[post_id]),
+                'post_create': reverse('posts:post_create'),
+                'post_edit': reverse('posts:post_edit', args=[post_id]),
+                'follow_index': reverse('posts:follow_index'),
+            }
+            report = {}
+            for name, url in pages.items():
+                def request(url=url):
+                    if options['cold_cache']:
+                        cache.clear()
+                    client.get(url)
+                report[name] = measure(request, repeat=options['repeat'])
+
+            def follow_round_trip():
+                client.get(reverse('posts:profile_follow', args=[author]))
+                client.get(reverse('posts:profile_unfollow', args=[author]))
+            report['follow_unfollow'] = measure(
+                follow_round_trip, repeat=options['repeat'])
+        write_report(self, report, options['output'])
@@ -0,0 +1,349 @@
+"""Метрики в формате Prometheus, общие для всех процессов на хосте.
+
+Каждый процесс копит значения у себя в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд переписывает свои итоги в файл SQLite
+METRICS_PATH, по строке на процесс и серию. /metrics складывает строки
+всех процессов, поэтому счётчики не теряются при перезапуске воркеров:
+у каждого процесса свой идентификатор, а строки умерших остаются.
+Файл стоит удалять при развёртывании, как каталог multiprocess
+у prometheus_client. При METRICS_ENABLED = False значения не копятся
+и файл не создаётся.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS metrics ('
+    'process TEXT NOT NULL, name TEXT NOT NULL, labels TEXT NOT NULL, '
+    'value REAL NOT NULL, PRIMARY KEY (process, name, labels)) '
+    'WITHOUT ROWID'
+)
+
+UPSERT = (
+    'INSERT INTO metrics (process, name, labels, value) '
+    'VALUES (?, ?, ?, ?) ON CONFLICT (process, name, labels) '
+    'DO UPDATE SET value = excluded.value'
+)
+
+LE_LABEL = re.compile(r',?le="([^"]*)"')
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def format_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for name, value in sorted(labels.items())
+    )
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._path = None
+
+    def _own(self):
+        # После fork значения родителя не наши: копим с нуля под своим
+        # идентификатором.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._process = f'{self._pid}-{time.time():.6f}'
+            self._values = {}
+            self._dirty = set()
+            self._flushed = time.monotonic()
+            self._connection = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def add(self, name, labels, amount):
+        if not settings.METRICS_ENABLED:
+            return
+        series = (name, format_labels(labels))
+        with self._lock:
+            self._own()
+            self._values[series] = self._values.get(series, 0) + amount
+            self._dirty.add(series)
+
+    def _connect(self):
+        path = self._path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute(SCHEMA)
+        return connection
+
+    def flush(self, force=True):
+        """Записывает изменившиеся серии процесса в общий файл. Без
+        force — только если с прошлой записи прошёл интервал.
+        """
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            self._own()
+            now = time.monotonic()
+            if not force and (
+                now - self._flushed < settings.METRICS_FLUSH_INTERVAL
+            ):
+                return
+            self._flushed = now
+            if not self._dirty:
+                return
+            rows = [
+                (self._process, name, labels, self._values[name, labels])
+                for name, labels in self._dirty
+            ]
+            self._dirty = set()
+            with self._db() as db:
+                db.execute('BEGIN IMMEDIATE')
+                db.executemany(UPSERT, rows)
+
+    def set(self, name, labels, value):
+        """Записывает значение, общее для всех процессов: строка без
+        идентификатора процесса, последняя запись побеждает.
+        """
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            self._db().execute(
+                UPSERT, ('', name, format_labels(labels), value))
+
+    def _db(self):
+        if (
+            self._connection is None
+            or self._path != settings.METRICS_PATH
+        ):
+            self._path = settings.METRICS_PATH
+            self._connection = self._connect()
+        return self._connection
+
+    def collect(self):
+        """Суммы по всем процессам: {(имя серии, метки): значение}."""
+        self.flush()
+        with self._lock:
+            rows = self._db().execute(
+                'SELECT name, labels, SUM(value) FROM metrics '
+                'GROUP BY name, labels'
+            ).fetchall()
+        return {(name, labels): value for name, labels, value in rows}
+
+    def exposition(self):
+        """Текст для /metrics в формате Prometheus 0.0.4."""
+        collected = self.collect()
+        lines = []
+        for metric in self.metrics:
+            samples = metric.samples(collected)
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                series = f'{name}{{{labels}}}' if labels else name
+                lines.append(f'{series} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry
+        registry.register(self)
+
+    def series(self):
+        return (self.name,)
+
+    def samples(self, collected):
+        names = self.series()
+        # Серии одной метрики идут подряд: _bucket, затем _sum и _count.
+        return [
+            (name, labels, value)
+            for name in names
+            for (series, labels), value in sorted(collected.items())
+            if series == name
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, labels, amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS,
+                 **kwargs):
+        super().__init__(name, documentation, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def series(self):
+        return tuple(
+            self.name + suffix for suffix in ('_bucket', '_sum', '_count'))
+
+    def observe(self, value, **labels):
+        for bound in self.buckets:
+            if value <= bound:
+                self.registry.add(
+                    self.name + '_bucket', {**labels, 'le': bound}, 1)
+        self.registry.add(self.name + '_bucket', {**labels, 'le': '+Inf'}, 1)
+        self.registry.add(self.name + '_sum', labels, value)
+        self.registry.add(self.name + '_count', labels, 1)
+
+    def samples(self, collected):
+        buckets, totals = [], []
+        for sample in super().samples(collected):
+            if sample[0] == self.name + '_bucket':
+                buckets.append(sample)
+            else:
+                totals.append(sample)
+        return sorted(buckets, key=_bucket_order) + totals
+
+
+def _bucket_order(sample):
+    # Границы по возрастанию чисел, а не строк: 0.5 раньше 10.0.
+    _, labels, _ = sample
+    bound = float(LE_LABEL.search(labels).group(1))
+    return LE_LABEL.sub('', labels), bound
+
+
+class Gauge(Metric):
+    """Значение, которое считается в момент запроса /metrics функцией
+    collect(), возвращающей {метки: значение} или None.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, collect, **kwargs):
+        super().__init__(name, documentation, **kwargs)
+        self.collect = collect
+
+    def samples(self, collected):
+        values = self.collect(collected)
+        if values is None:
+            return []
+        return [
+            (self.name, format_labels(dict(labels)), value)
+            for labels, value in values.items()
+        ]
+
+
+def _cache_hit_ratio(collected):
+    totals, hits = {}, {}
+    for (name, labels), value in collected.items():
+        if name != CACHE_REQUESTS.name:
+            continue
+        cache = labels.split('cache="', 1)[1].split('"', 1)[0]
+        totals[cache] = totals.get(cache, 0) + value
+        if 'outcome="miss"' not in labels:
+            hits[cache] = hits.get(cache, 0) + value
+    return {
+        (('cache', cache),): round(hits.get(cache, 0) / total, 4)
+        for cache, total in totals.items()
+    }
+
+
+class SharedGauge(Metric):
+    """Значение, которое записывает один из процессов и видят все."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.registry.set(self.name, labels, value)
+
+
+class ActiveSessions:
+    """Число живых сессий для ACTIVE_SESSIONS. Пересчитывается не чаще
+    раза в METRICS_SESSIONS_INTERVAL секунд на процесс, а /metrics
+    читает его из файла метрик, не обращаясь к базе.
+    """
+
+    def __init__(self):
+        self._refreshed = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        if not settings.METRICS_ENABLED:
+            return
+        # Число живых сессий видно только в хранилищах на базе данных.
+        if settings.SESSION_ENGINE not in (
+            'django.contrib.sessions.backends.db',
+            'django.contrib.sessions.backends.cached_db',
+        ):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._refreshed is not None and (
+                now - self._refreshed < settings.METRICS_SESSIONS_INTERVAL
+            ):
+                return
+            self._refreshed = now
+        from django.contrib.sessions.models import Session
+        from django.utils import timezone
+
+        ACTIVE_SESSIONS.set(
+            Session.objects.filter(expire_date__gt=timezone.now()).count())
+
+
+REQUESTS = Counter(
+    'yatube_requests_total',
+    'Запросы по представлениям, методам и кодам ответа.',
+)
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по представлениям.',
+)
+DB_QUERIES = Counter(
+    'yatube_db_queries_total',
+    'SQL-запросы по представлениям.',
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total',
+    'Обращения к кэшу страниц и фрагментов: hit, stale или miss.',
+)
+CACHE_HIT_RATIO = Gauge(
+    'yatube_cache_hit_ratio',
+    'Доля обращений к кэшу, отданных без пересчёта.',
+    _cache_hit_ratio,
+)
+RENDITION_DURATION = Histogram(
+    'yatube_rendition_duration_seconds',
+    'Время построения копии картинки для ленты.',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+PASSWORD_HASHES = Counter(
+    'yatube_password_hashes_total',
+    'Хеши паролей в пуле: done — посчитан, failed — хешер упал, '
+    'rejected — очередь полна.',
+)
+ACTIVE_SESSIONS = SharedGauge(
+    'yatube_active_sessions',
+    'Неистёкшие сессии.',
+)
+SESSIONS = ActiveSessions()
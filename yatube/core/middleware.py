@@ -0,0 +1,142 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.shortcuts import render
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils.text import slugify
+
+from core import metrics, profiling
+from core.hashing import HashingBusy
+
+logger = logging.getLogger('core.profiling')
+
+
+class MetricsMiddleware:
+    """Считает для /metrics запросы, время ответа и SQL-запросы по
+    представлениям. Стоит первым в MIDDLEWARE, чтобы учитывать и ответы
+    из кэша страниц: для них представление находится по адресу.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        view = self.view_name(request)
+        metrics.REQUESTS.inc(
+            view=view, method=request.method, status=response.status_code)
+        metrics.REQUEST_DURATION.observe(elapsed, view=view)
+        if queries:
+            metrics.DB_QUERIES.inc(queries, view=view)
+        metrics.SESSIONS.refresh()
+        metrics.REGISTRY.flush(force=False)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = request.resolver_match
+        if match is None:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return 'unresolved'
+        return match.view_name
+
+
+class ProfilingMiddleware:
+    """Замеряет каждый запрос: общее время, число и время SQL-запросов,
+    время отрисовки шаблонов, попадания в кэш страниц и фрагментов.
+
+    Итог уходит в заголовок Server-Timing и строкой JSON в логгер
+    core.profiling. Если PROFILING_SAMPLE_RATE = N > 0, один запрос из N
+    в среднем проходит под cProfile, статистика сохраняется в
+    PROFILING_DIR. Включается настройкой PROFILING_ENABLED; стоит в
+    MIDDLEWARE до кэша страниц, чтобы учитывать и ответы из него.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        profiler = None
+        if self.sample_rate and random.randrange(self.sample_rate) == 0:
+            profiler = cProfile.Profile()
+        profile = profiling.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                if profiler is None:
+                    response = self.get_response(request)
+                else:
+                    response = profiler.runcall(self.get_response, request)
+        finally:
+            profiling.stop()
+        response['Server-Timing'] = profile.server_timing()
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **profile.as_dict(),
+        }
+        if profiler is not None:
+            record['profile'] = self.dump(profiler, request)
+        logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+    @staticmethod
+    def dump(profiler, request):
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        name = '{:.0f}-{}-{}.prof'.format(
+            time.time() * 1000,
+            request.method.lower(),
+            slugify(request.path) or 'root',
+        )
+        path = os.path.join(settings.PROFILING_DIR, name)
+        profiler.dump_stats(path)
+        return path
+
+
+class PasswordHashingMiddleware:
+    """Отвечает 503 с Retry-After, когда очередь хеширования паролей
+    заполнена: вход и регистрация при всплеске нагрузки отказывают
+    сразу, а не копятся в воркерах.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = render(request, 'core/503.html', status=503)
+        response['Retry-After'] = settings.PASSWORD_HASHING_RETRY_AFTER
+        return response
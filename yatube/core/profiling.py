@@ -0,0 +1,105 @@
+"""Замеры одного запроса: время ORM, шаблонов и исходы обращений к кэшу.
+
+Замер привязан к потоку, который обрабатывает запрос; пока он не
+начат, учёт в шаблонах и кэше сводится к одной проверке. Включает его
+core.middleware.ProfilingMiddleware.
+"""
+import threading
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+CACHE_OUTCOMES = ('hit', 'stale', 'miss')
+
+_local = threading.local()
+
+
+class RequestProfile:
+    """Счётчики одного запроса. Экземпляр — обёртка execute для
+    connection.execute_wrapper(), она считает SQL-запросы и их время.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.cache = dict.fromkeys(CACHE_OUTCOMES, 0)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - started
+            self.queries += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'duration_ms': round(self.elapsed() * 1000, 2),
+            'queries': self.queries,
+            'query_ms': round(self.query_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache': dict(self.cache),
+        }
+
+    def server_timing(self):
+        cache = ' '.join(f'{name}={self.cache[name]}' for name in self.cache)
+        return ', '.join((
+            f'db;dur={self.query_time * 1000:.2f};desc="{self.queries} SQL"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'cache;desc="{cache}"',
+            f'total;dur={self.elapsed() * 1000:.2f}',
+        ))
+
+
+def start():
+    _local.profile = RequestProfile()
+    return _local.profile
+
+
+def stop():
+    _local.profile = None
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def record_cache(outcome):
+    """Отмечает исход обращения к кэшу: 'hit', 'stale' или 'miss'."""
+    profile = current()
+    if profile is not None:
+        profile.cache[outcome] += 1
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        profile = current()
+        if profile is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Движок шаблонов Django, шаблоны которого учитывают время
+    отрисовки в замере запроса. Вложенные {% include %} отрисовываются
+    внутри внешнего шаблона и отдельно не считаются.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
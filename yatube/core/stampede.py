@@ -0,0 +1,94 @@
+"""Защита кэша от лавины пересчётов.
+
+Запись хранит значение вместе с поколением, временем логического
+истечения и длительностью последнего пересчёта. Пересчитывает только
+запрос, взявший блокировку через cache.add(); остальные в это время
+получают прежнее значение. Срок записи в кэше длиннее логического,
+чтобы такое значение было что отдавать. Истечение наступает чуть
+раньше срока с вероятностью, растущей к его концу и со временем
+пересчёта (XFetch), поэтому горячий ключ обычно обновляется до того,
+как его начнут ждать.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+from core import metrics
+from core.profiling import record_cache
+
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+BETA = 1.0
+
+
+def _is_fresh(entry, version, now, beta):
+    _, entry_version, delta, expires = entry
+    if entry_version != version:
+        return False
+    # 1 - random() лежит в (0, 1], логарифм конечен.
+    return now - delta * beta * math.log(1 - random.random()) < expires
+
+
+def _record(name, outcome):
+    record_cache(outcome)
+    metrics.CACHE_REQUESTS.inc(cache=name, outcome=outcome)
+
+
+def get_or_compute(key, compute, timeout, version=None, stale_timeout=None,
+                   beta=BETA, store_if=None, cache=None, name='other'):
+    """Значение из кэша или результат compute(), посчитанный одним
+    запросом на истечение.
+
+    Запись другого поколения version считается истёкшей, но годится
+    как устаревшее значение на время пересчёта. stale_timeout — сколько
+    запись живёт в кэше после логического истечения (по умолчанию ещё
+    timeout). store_if позволяет не сохранять отдельные результаты.
+    name — метка кэша в метриках попаданий.
+    """
+    cache = cache or default_cache
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version, time.time(), beta):
+        _record(name, 'hit')
+        return entry[0]
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            return _recompute(
+                cache, key, compute, timeout, version, stale_timeout,
+                store_if, name)
+        finally:
+            cache.delete(lock_key)
+    if entry is not None:
+        _record(name, 'stale')
+        return entry[0]
+    # Старого значения нет: ждём того, кто держит блокировку.
+    deadline = time.time() + LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            _record(name, 'hit')
+            return entry[0]
+        if not cache.has_key(lock_key):
+            break
+    return _recompute(
+        cache, key, compute, timeout, version, stale_timeout, store_if, name)
+
+
+def _recompute(cache, key, compute, timeout, version, stale_timeout,
+               store_if, name):
+    _record(name, 'miss')
+    started = time.time()
+    value = compute()
+    finished = time.time()
+    if store_if is None or store_if(value):
+        if stale_timeout is None:
+            stale_timeout = timeout
+        cache.set(
+            key,
+            (value, version, finished - started, finished + timeout),
+            timeout + stale_timeout
+        )
+    return value
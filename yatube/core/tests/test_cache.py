@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+def increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """get, set, add, incr, delete и get_many ведут себя как у
+        встроенных бэкендов
+        """
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 1))
+        self.assertEqual(self.cache.incr('new', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertEqual(
+            self.cache.get_many(['key', 'new', 'missing']),
+            {'key': {'value': 1}, 'new': 6}
+        )
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertFalse(self.cache.has_key('new'))
+
+    def test_expired_entries(self):
+        """Просроченная запись не отдаётся и уступает место add()"""
+        self.cache.set('key', 'old', timeout=-1)
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    @mock.patch('core.cache.ACCESS_RESOLUTION', 0)
+    def test_size_limit_evicts_least_recently_used(self):
+        """При превышении MAX_SIZE вытесняются давно не читавшиеся"""
+        cache = self.make_cache(MAX_SIZE=10 * 1024, CULL_FREQUENCY=2)
+        cache.set('hot', 'x' * 1024)
+        for i in range(20):
+            cache.set(f'cold{i}', 'x' * 1024)
+            cache.get('hot')
+        size = cache._connection().execute(
+            'SELECT SUM(size) FROM cache').fetchone()[0]
+        self.assertLessEqual(size, 10 * 1024)
+        self.assertEqual(cache.get('hot'), 'x' * 1024)
+        self.assertIsNone(cache.get('cold0'))
+
+    def test_shared_between_processes(self):
+        """Запись одного процесса видна другим, incr не теряет шагов"""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 200)
@@ -0,0 +1,93 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import hashing, metrics
+from core.tests.test_metrics import TemporaryMetricsPath, parse
+
+User = get_user_model()
+
+FAST_OPTIONS = {'pbkdf2_sha256': {'iterations': 1000}}
+
+
+@override_settings(
+    PASSWORD_HASHING_WORKERS=1,
+    PASSWORD_HASHING_QUEUE=0,
+    PASSWORD_HASHER_OPTIONS=FAST_OPTIONS,
+)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='hashed', password='old-secret')
+
+    def login(self, password='old-secret'):
+        return self.client.post(
+            reverse('users:login'),
+            {'username': 'hashed', 'password': password}
+        )
+
+    def password(self):
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_rehash_on_login_with_new_options(self):
+        """Хеш со старыми параметрами перехешируется при входе"""
+        self.assertTrue(self.password().startswith('pbkdf2_sha256$1000$'))
+        with self.settings(
+            PASSWORD_HASHER_OPTIONS={'pbkdf2_sha256': {'iterations': 1200}}
+        ):
+            self.assertEqual(self.login().status_code, 302)
+        self.assertTrue(self.password().startswith('pbkdf2_sha256$1200$'))
+
+    def test_rehash_legacy_algorithm(self):
+        """Хеш другого алгоритма заменяется предпочтительным; проверка
+        SHA1 внутри пула не ждёт сама себя
+        """
+        self.user.password = make_password(
+            'old-secret', hasher='pbkdf2_sha1')
+        self.user.save()
+        self.assertEqual(self.login().status_code, 302)
+        self.assertTrue(self.password().startswith('pbkdf2_sha256$'))
+
+    def test_full_queue_answers_503(self):
+        """Переполненная очередь хеширования отвечает 503 с Retry-After"""
+        started, release = threading.Event(), threading.Event()
+
+        def occupy():
+            hashing.run(lambda: (started.set(), release.wait(5)))
+        worker = threading.Thread(target=occupy)
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(release.set)
+        started.wait(5)
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        release.set()
+        worker.join()
+        self.assertEqual(self.login().status_code, 302)
+
+
+class HashingMetricsTests(TemporaryMetricsPath, SimpleTestCase):
+    def outcomes(self):
+        samples = parse(metrics.REGISTRY.exposition())
+        return {
+            outcome: samples.get(
+                f'yatube_password_hashes_total{{outcome="{outcome}"}}', 0)
+            for outcome in ('done', 'failed')
+        }
+
+    def test_failures_counted_separately(self):
+        """Упавший хеш не считается посчитанным"""
+        pool = hashing.HashingPool(1, 0)
+        self.addCleanup(pool.shutdown)
+        before = self.outcomes()
+        self.assertEqual(pool.run(str, 1), '1')
+        with self.assertRaises(ValueError):
+            pool.run(int, 'не число')
+        after = self.outcomes()
+        self.assertEqual(after['done'] - before['done'], 1)
+        self.assertEqual(after['failed'] - before['failed'], 1)
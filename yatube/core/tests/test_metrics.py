@@ -0,0 +1,164 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.metrics import Counter, Histogram, Registry
+from posts.models import Post
+
+User = get_user_model()
+
+
+def parse(text):
+    """Разбирает текст /metrics в {серия с метками: значение}."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            series, value = line.rsplit(' ', 1)
+            samples[series] = float(value)
+    return samples
+
+
+class TemporaryMetricsPath:
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(
+            METRICS_ENABLED=True,
+            METRICS_PATH=os.path.join(self.directory, 'metrics.sqlite3'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+
+def add_in_child(counter, histogram):
+    counter.inc(2, view='index')
+    histogram.observe(0.3, view='index')
+    counter.registry.flush()
+
+
+class RegistryTests(TemporaryMetricsPath, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry()
+        self.counter = Counter(
+            'test_total', 'Счётчик.', registry=self.registry)
+        self.histogram = Histogram(
+            'test_seconds', 'Время.', buckets=(0.1, 0.5, 10),
+            registry=self.registry)
+
+    def test_histogram_buckets(self):
+        """Гистограмма накопительная, границы по возрастанию"""
+        self.histogram.observe(0.3, view='index')
+        self.histogram.observe(0.05, view='index')
+        lines = [
+            line for line in self.registry.exposition().splitlines()
+            if line.startswith('test_seconds')
+        ]
+        self.assertEqual(lines, [
+            'test_seconds_bucket{le="0.1",view="index"} 1',
+            'test_seconds_bucket{le="0.5",view="index"} 2',
+            'test_seconds_bucket{le="10",view="index"} 2',
+            'test_seconds_bucket{le="+Inf",view="index"} 2',
+            'test_seconds_sum{view="index"} 0.35',
+            'test_seconds_count{view="index"} 2',
+        ])
+
+    def test_label_escaping(self):
+        self.counter.inc(view='a"b\\c')
+        self.assertIn(
+            'test_total{view="a\\"b\\\\c"} 1', self.registry.exposition())
+
+    def test_processes_are_summed(self):
+        """Значения других процессов складываются с нашими"""
+        self.counter.inc(view='index')
+        self.registry.flush()
+        context = multiprocessing.get_context('fork')
+        for _ in range(2):
+            child = context.Process(
+                target=add_in_child, args=(self.counter, self.histogram))
+            child.start()
+            child.join()
+            self.assertEqual(child.exitcode, 0)
+        samples = parse(self.registry.exposition())
+        self.assertEqual(samples['test_total{view="index"}'], 5)
+        self.assertEqual(samples['test_seconds_count{view="index"}'], 2)
+
+    def test_disabled(self):
+        """Выключенные метрики не копятся и не пишут файл"""
+        with self.settings(METRICS_ENABLED=False):
+            self.counter.inc(view='index')
+            self.registry.flush()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+@override_settings(METRICS_SESSIONS_INTERVAL=0)
+class MetricsViewTests(TemporaryMetricsPath, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='measured')
+        cls.staff = User.objects.create_user(
+            username='operator', is_staff=True)
+        Post.objects.create(text='Пост для метрик', author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_requests_cache_and_sessions(self):
+        """/metrics считает запросы, SQL, кэш страниц и сессии"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        user_client = self.client_class()
+        user_client.force_login(self.user)
+        user_client.get(reverse('posts:follow_index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        samples = parse(response.content.decode())
+        self.assertEqual(samples[
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"}'
+        ], 2)
+        self.assertEqual(samples[
+            'yatube_request_duration_seconds_count{view="posts:index"}'
+        ], 2)
+        self.assertGreater(
+            samples['yatube_db_queries_total{view="posts:follow_index"}'], 0)
+        self.assertEqual(samples[
+            'yatube_cache_requests_total{cache="page",outcome="hit"}'
+        ], 1)
+        self.assertEqual(
+            samples['yatube_cache_hit_ratio{cache="page"}'], 0.5)
+        self.assertEqual(samples['yatube_active_sessions'], 1)
+
+    def test_sessions_gauge_read_from_registry(self):
+        """/metrics не считает сессии в базе при каждом запросе"""
+        with self.settings(METRICS_SESSIONS_INTERVAL=3600):
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('metrics'))
+        self.assertFalse([
+            query for query in captured
+            if 'django_session' in query['sql']
+        ])
+
+    def test_access(self):
+        """Чужим адресам /metrics отдаётся только для сотрудников"""
+        remote = {'REMOTE_ADDR': '203.0.113.5'}
+        response = self.client.get(reverse('metrics'), **remote)
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('metrics'), **remote)
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'), **remote)
+        self.assertEqual(response.status_code, 200)
+        with self.settings(METRICS_ENABLED=False):
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,85 @@
+import json
+import pstats
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+PROFILES_DIR = tempfile.mkdtemp()
+
+
+def timing(response):
+    """Разбирает Server-Timing в {метрика: {параметр: значение}}."""
+    metrics = {}
+    for metric in response['Server-Timing'].split(', '):
+        name, *params = metric.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_DIR=PROFILES_DIR)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='profiled')
+        Post.objects.create(text='Замеренный пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(PROFILES_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing(self):
+        """Server-Timing перечисляет SQL, шаблоны, кэш и общее время"""
+        self.client.force_login(self.user)
+        with self.assertLogs('core.profiling', 'INFO'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('posts:index'))
+        metrics = timing(response)
+        self.assertEqual(
+            metrics['db']['desc'], f'"{len(queries.captured_queries)} SQL"')
+        self.assertGreater(float(metrics['tpl']['dur']), 0)
+        self.assertGreater(
+            float(metrics['total']['dur']), float(metrics['db']['dur']))
+        self.assertEqual(metrics['cache']['desc'], '"hit=0 stale=0 miss=1"')
+
+    def test_page_cache_hit(self):
+        """Ответ из кэша страниц тоже замеряется и без SQL"""
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+            response = self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[1].getMessage())
+        self.assertEqual(record['path'], reverse('posts:index'))
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], 0)
+        self.assertEqual(record['cache'], {'hit': 1, 'stale': 0, 'miss': 0})
+        self.assertNotIn('profile', record)
+        self.assertIn('cache;desc="hit=1', response['Server-Timing'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_profile(self):
+        """Выбранный запрос сохраняет статистику cProfile"""
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            self.client.get(reverse('about:author'))
+        record = json.loads(logs.records[0].getMessage())
+        stats = pstats.Stats(record['profile'])
+        self.assertTrue(stats.total_calls)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        """Без PROFILING_ENABLED заголовка нет"""
+        response = self.client.get(reverse('about:author'))
+        self.assertNotIn('Server-Timing', response)
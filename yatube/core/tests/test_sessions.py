@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+User = get_user_model()
+
+
+class SessionBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='session_reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reads_do_not_write_sessions(self):
+        """Запросы вошедшего пользователя не записывают сессию, а
+        cached_db и signed_cookies её и не читают из БД
+        """
+        for backend, engine in settings.SESSION_BACKENDS.items():
+            with self.subTest(backend=backend), override_settings(
+                SESSION_ENGINE=engine
+            ):
+                # SessionMiddleware выбирает хранилище при загрузке,
+                # поэтому на каждое хранилище свой клиент.
+                client = self.client_class()
+                client.force_login(self.user)
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(reverse('posts:follow_index'))
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn(
+                    settings.SESSION_COOKIE_NAME, response.cookies)
+                session_queries = [
+                    query['sql'] for query in captured
+                    if 'django_session' in query['sql']
+                ]
+                self.assertFalse([
+                    sql for sql in session_queries
+                    if not sql.startswith('SELECT')
+                ])
+                self.assertEqual(
+                    len(session_queries), 1 if backend == 'db' else 0)
@@ -0,0 +1,90 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from core.stampede import get_or_compute
+
+THREADS = 8
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('stampede', {})
+        self.cache.clear()
+        self.computed = 0
+        self.counter_lock = threading.Lock()
+
+    def slow(self, value):
+        def compute():
+            with self.counter_lock:
+                self.computed += 1
+            time.sleep(0.2)
+            return value
+        return compute
+
+    def concurrently(self, compute, version=None):
+        barrier = threading.Barrier(THREADS)
+        results = []
+
+        def request():
+            barrier.wait()
+            results.append(get_or_compute(
+                'key', compute, 60, version=version, cache=self.cache))
+
+        threads = [threading.Thread(target=request) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_recompute_on_cold_miss(self):
+        """Без значения в кэше считает один поток, остальные ждут его"""
+        results = self.concurrently(self.slow('value'))
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(results, ['value'] * THREADS)
+
+    def test_stale_value_during_recompute(self):
+        """После смены поколения пересчёт один, остальные получают
+        прежнее значение без ожидания
+        """
+        get_or_compute('key', lambda: 'old', 60, version=1, cache=self.cache)
+        started = time.time()
+        results = self.concurrently(self.slow('new'), version=2)
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(sorted(results), ['new'] + ['old'] * (THREADS - 1))
+        self.assertEqual(
+            get_or_compute('key', self.slow('newer'), 60, version=2,
+                           cache=self.cache),
+            'new'
+        )
+        self.assertLess(time.time() - started, 1)
+
+    def test_probabilistic_early_expiry(self):
+        """Близкий к концу срок истекает раньше с вероятностью, которую
+        задаёт случайное число
+        """
+        get_or_compute('key', lambda: 'old', 60, cache=self.cache)
+        value, version, _, expires = self.cache.get('key')
+        # Пересчёт занял 10 секунд, до истечения осталась одна.
+        self.cache.set('key', (value, version, 10.0, time.time() + 1), 120)
+        with mock.patch('core.stampede.random.random', return_value=0.0):
+            self.assertEqual(
+                get_or_compute('key', lambda: 'new', 60, cache=self.cache),
+                'old'
+            )
+        with mock.patch('core.stampede.random.random', return_value=0.99):
+            self.assertEqual(
+                get_or_compute('key', lambda: 'new', 60, cache=self.cache),
+                'new'
+            )
+
+    def test_store_if(self):
+        """Результат, отклонённый store_if, не сохраняется"""
+        get_or_compute(
+            'key', lambda: 'error', 60, store_if=lambda value: False,
+            cache=self.cache)
+        self.assertIsNone(self.cache.get('key'))
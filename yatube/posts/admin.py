@@ -1,8 +1,53 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from posts import search
+from posts.paginators import EstimatedCountPaginator
 from .models import Post, Group, Comment, Follow
 
+User = get_user_model()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT(*): оценка числа строк вместо точного
+    подсчёта и без второго подсчёта всей таблицы при фильтрах.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def get_queryset(self, request):
+        """С date_hierarchy список читается через менеджер date_probes:
+        годы, месяцы и дни находятся пробами по индексу даты.
+        """
+        if not self.date_hierarchy:
+            return super().get_queryset(request)
+        queryset = self.model.date_probes.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
 
-class PostAdmin(admin.ModelAdmin):
+
+class TextSearchAdmin(LargeTableAdmin):
+    """Поиск по тексту через полнотекстовый индекс posts_search вместо
+    LIKE по всей таблице; без индекса — обычный поиск по search_fields.
+    Слова ищутся как начала слов: в поиске списка и в autocomplete
+    текст набирают по буквам.
+    """
+    search_kind = search.POST
+
+    def get_search_results(self, request, queryset, search_term):
+        ids = search.matching_ids(
+            search_term, self.search_kind, prefix=True)
+        if ids is None:
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.filter(pk__in=ids), False
+
+
+class PostAdmin(TextSearchAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,10 +56,11 @@ class PostAdmin(admin.ModelAdmin):
         'group',
         'image'
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'pub_date'
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -24,33 +70,47 @@ class GroupAdmin(admin.ModelAdmin):
         'description'
     )
     list_editable = ()
-    search_fields = ('text',)
+    search_fields = ('title', 'slug')
     list_filter = ()
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(TextSearchAdmin):
     list_display = (
         'post',
         'author',
         'text',
         'created'
     )
-    list_editable = ()
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ()
-    empty_value_display = '-пусто-'
+    search_kind = search.COMMENT
+    date_hierarchy = 'created'
+    ordering = ('-created', '-id')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author'
     )
-    list_editable = ()
-    search_fields = ('text',)
-    list_filter = ()
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    ordering = ('author', 'user', 'id')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Точное имя подписчика или автора: поиск по уникальному
+        индексу username, а подписки — по индексам Follow.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        user_ids = User.objects.filter(
+            username=term).values_list('pk', flat=True)
+        return queryset.filter(
+            Q(user__in=user_ids) | Q(author__in=user_ids)), False
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,61 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import AuthorStats, Follow, Post
+
+COUNTED = {
+    'posts_count': Post.objects.filter,
+    'followers_count': Follow.objects.filter,
+}
+
+
+def count_stats(author_id):
+    """Честный подсчёт всех счётчиков автора по исходным таблицам."""
+    return {
+        field: manager_filter(author_id=author_id).count()
+        for field, manager_filter in COUNTED.items()
+    }
+
+
+def change_stats(author_id, field, delta):
+    """Сдвигает счётчик автора; пустую строку заполняет подсчётом."""
+    if author_id is None:
+        return
+    updated = AuthorStats.objects.filter(author_id=author_id).update(
+        **{field: F(field) + delta})
+    if not updated:
+        AuthorStats.objects.get_or_create(
+            author_id=author_id, defaults=count_stats(author_id))
+
+
+RECOUNT_CHUNK = 500
+
+
+def recount_stats(author_ids, field):
+    """Пересчитывает счётчик у существующих строк авторов одним UPDATE
+    с подзапросом на пачку — после массовых изменений без сигналов.
+    """
+    author_ids = sorted(set(author_ids) - {None})
+    totals = COUNTED[field](
+        author_id=OuterRef('author_id')
+    ).order_by().values('author_id').annotate(
+        total=Count('pk')
+    ).values('total')
+    for start in range(0, len(author_ids), RECOUNT_CHUNK):
+        AuthorStats.objects.filter(
+            author_id__in=author_ids[start:start + RECOUNT_CHUNK]
+        ).update(**{field: Coalesce(Subquery(totals), 0)})
+
+
+def get_stats(author):
+    try:
+        return author.stats
+    except AuthorStats.DoesNotExist:
+        stats, _ = AuthorStats.objects.get_or_create(
+            author=author, defaults=count_stats(author.pk))
+        return stats
+
+
+def get_posts_count(author):
+    """Количество постов автора из таблицы счётчиков."""
+    return get_stats(author).posts_count
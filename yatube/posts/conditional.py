@@ -0,0 +1,82 @@
+"""Условные GET-ответы. ETag и Last-Modified собираются из штампов лент
+в кэше, поэтому повторный запрос получает 304 без чтения постов.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from posts.feed_cache import (
+    get_feed_modified, get_feed_version, get_follows_modified,
+    get_timeline_modified
+)
+
+
+def conditional(viewer=False, follows=False, timeline=False):
+    """Декоратор condition() со штампом, зависящим от поколения лент и
+    адреса, а также, по флагам, от cookie зрителя, от подписок всех
+    пользователей и от ленты подписок самого зрителя.
+    """
+    def stamps(request):
+        parts = [get_feed_version(), request.get_full_path()]
+        times = [get_feed_modified()]
+        if viewer:
+            # HTML зависит от сессии (шапка, CSRF-токен в формах); ключ
+            # берётся из cookie, чтобы не загружать саму сессию.
+            parts += [
+                request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            ]
+        if follows:
+            times.append(get_follows_modified())
+            parts.append(times[-1])
+        if timeline:
+            times.append(get_timeline_modified(request.user.pk))
+            parts += [request.user.pk, times[-1]]
+        return parts, [stamp for stamp in times if stamp is not None]
+
+    def etag(request, *args, **kwargs):
+        parts, _ = stamps(request)
+        raw = '|'.join(map(str, parts))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        _, times = stamps(request)
+        if not times:
+            return None
+        return datetime.fromtimestamp(max(times), timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def public_page(follows=False, timeline=False):
+    """Условный GET для публичной страницы с Cache-Control и
+    Vary: Cookie: анонимный ответ могут хранить общие кэши, ответ
+    с сессией — только браузер, и оба перепроверяются через 304.
+    """
+    conditional_view = conditional(
+        viewer=True, follows=follows, timeline=timeline)
+
+    def decorator(view):
+        view = conditional_view(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if settings.SESSION_COOKIE_NAME in request.COOKIES:
+                scope = {'private': True}
+            else:
+                scope = {'public': True}
+            patch_cache_control(
+                response,
+                max_age=settings.PUBLIC_PAGE_MAX_AGE,
+                must_revalidate=True,
+                **scope
+            )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,83 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_VERSION_KEY = 'posts:feed_version'
+FEED_MODIFIED_KEY = 'posts:feed_modified'
+TIMELINE_MODIFIED_KEY = 'posts:timeline_modified:{}'
+FOLLOWS_MODIFIED_KEY = 'posts:follows_modified'
+
+
+def _initial_version():
+    # После вытеснения счётчика версии из кэша нельзя начинать с единицы:
+    # под старыми номерами могут ещё лежать фрагменты с длинным TTL.
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    """Текущее значение бессрочного счётчика поколений."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key, _initial_version())
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def get_feed_version():
+    """Текущее поколение лент; входит в ключ каждого фрагмента."""
+    return get_version(FEED_VERSION_KEY)
+
+
+def bump_feed_version():
+    """Делает все ранее закэшированные фрагменты лент недоступными."""
+    bump_version(FEED_VERSION_KEY)
+    cache.set(FEED_MODIFIED_KEY, time.time(), None)
+
+
+def get_feed_modified():
+    """Время последнего изменения лент или None, если оно неизвестно."""
+    return cache.get(FEED_MODIFIED_KEY)
+
+
+def get_timeline_modified(user_id):
+    """Время последней подписки или отписки пользователя."""
+    return cache.get(TIMELINE_MODIFIED_KEY.format(user_id))
+
+
+def bump_timeline_modified(user_id):
+    """Отмечает изменение состава ленты подписок пользователя."""
+    now = time.time()
+    cache.set(TIMELINE_MODIFIED_KEY.format(user_id), now, None)
+    cache.set(FOLLOWS_MODIFIED_KEY, now, None)
+
+
+def get_follows_modified():
+    """Время последней подписки или отписки кого угодно."""
+    return cache.get(FOLLOWS_MODIFIED_KEY)
+
+
+def feed_cache_context(request, feed):
+    """Переменные для {% cache %}: лента, поколение, страница, зритель."""
+    if 'cursor' in request.GET:
+        page_key = 'c:' + request.GET['cursor']
+    else:
+        page_key = 'p:' + request.GET.get('page', '1')
+    if request.user.is_authenticated:
+        viewer = 'auth'
+    else:
+        viewer = 'anon'
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_cache_name': feed,
+        'feed_version': get_feed_version(),
+        'feed_page_key': page_key,
+        'feed_viewer': viewer,
+    }
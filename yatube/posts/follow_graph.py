@@ -0,0 +1,79 @@
+"""Граф подписок поверх Follow.
+
+Множество авторов, на которых подписан пользователь, лежит в кэше
+по ключу на пользователя и читается одним обращением, поэтому пометить
+подписки у целой страницы постов — одно чтение кэша, а не запрос на
+автора. Подписка и отписка правят закэшированное множество на месте
+(их вызывают сигналы Follow); одновременные правки одного
+пользователя из разных процессов могут разойтись, такое расхождение
+живёт не дольше FOLLOW_GRAPH_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from posts.author_stats import get_stats
+from posts.models import Follow
+
+FOLLOWING_KEY = 'posts:following:{}'
+
+
+def _user_id(user):
+    if user is None or isinstance(user, int):
+        return user
+    return user.pk if user.is_authenticated else None
+
+
+def following_ids(user):
+    """Множество id авторов, на которых подписан пользователь."""
+    user_id = _user_id(user)
+    if user_id is None:
+        return frozenset()
+    key = FOLLOWING_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Follow.objects.filter(
+            user_id=user_id, author__isnull=False
+        ).values_list('author_id', flat=True))
+        cache.set(key, ids, settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def is_following(viewer, authors):
+    """{id автора: подписан ли на него viewer} для пользователей или
+    их id; анонимный зритель не подписан ни на кого.
+    """
+    ids = following_ids(viewer)
+    return {
+        author_id: author_id in ids
+        for author_id in (_user_id(author) for author in authors)
+    }
+
+
+def following_count(user):
+    return len(following_ids(user))
+
+
+def follower_count(author):
+    return get_stats(author).followers_count
+
+
+def _update(user_id, change):
+    if user_id is None:
+        return
+    key = FOLLOWING_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is not None:
+        cache.set(key, change(ids), settings.FOLLOW_GRAPH_TIMEOUT)
+
+
+def add(user_id, author_id):
+    _update(user_id, lambda ids: ids | {author_id})
+
+
+def remove(user_id, author_id):
+    _update(user_id, lambda ids: ids - {author_id})
+
+
+def forget(user_ids):
+    """Сбрасывает множества после массовых правок подписок."""
+    cache.delete_many([FOLLOWING_KEY.format(user_id) for user_id in user_ids])
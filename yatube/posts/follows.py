@@ -0,0 +1,196 @@
+"""Подписки и отписки.
+
+Одиночная подписка — один INSERT, пропускающий существующую пару, а
+отписка — один DELETE: проверка «уже подписан?» отдельным запросом
+лишняя и не защищает от гонки двух кликов. По числу изменённых строк
+видно, была ли подписка новой; только тогда обновляются счётчик автора,
+граф подписок, лента подписчика и кэши страниц.
+
+Массовые подписки пишутся через bulk_create(ignore_conflicts=True) и
+не отправляют сигналов, поэтому производные данные досчитываются
+на пачку целиком — только для пар, которых в базе ещё не было.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from posts import follow_graph, page_cache, timeline
+from posts.author_stats import change_stats, recount_stats
+from posts.feed_cache import bump_timeline_modified
+from posts.models import Follow, Post, User
+
+# Пара — два параметра запроса, и пачка вместе с id подписчиков
+# укладывается в 999 параметров старых сборок SQLite.
+BULK_CHUNK = 400
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(
+            follow=connection.ops.quote_name(Follow._meta.db_table)
+        ), params)
+        return cursor.rowcount
+
+
+def invalidate(user, author):
+    """Сбрасывает ленту подписчика и профили обоих пользователей."""
+    if user is not None:
+        bump_timeline_modified(user.pk)
+    page_cache.purge(*(
+        page_cache.profile_tag(person.username)
+        for person in (user, author) if person is not None
+    ))
+
+
+def followed(user, author):
+    """Производные данные новой подписки."""
+    if author is not None:
+        change_stats(author.pk, 'followers_count', 1)
+        timeline.promote([author.pk])
+    if user is not None and author is not None:
+        follow_graph.add(user.pk, author.pk)
+        timeline.follow(user.pk, author.pk)
+    invalidate(user, author)
+
+
+def unfollowed(user, author):
+    """Производные данные отменённой подписки."""
+    if author is not None:
+        change_stats(author.pk, 'followers_count', -1)
+        timeline.demote([author.pk])
+    if user is not None and author is not None:
+        follow_graph.remove(user.pk, author.pk)
+        timeline.unfollow(user.pk, author.pk)
+    invalidate(user, author)
+
+
+def follow(user, author):
+    """Подписывает user на author; True, если подписки ещё не было."""
+    if user.pk == author.pk:
+        return False
+    created = _execute(
+        '{insert} {{follow}} (user_id, author_id) VALUES (%s, %s) '
+        '{suffix}'.format(
+            insert=connection.ops.insert_statement(ignore_conflicts=True),
+            suffix=connection.ops.ignore_conflicts_suffix_sql(
+                ignore_conflicts=True),
+        ),
+        [user.pk, author.pk]
+    )
+    if created:
+        followed(user, author)
+    return bool(created)
+
+
+def unfollow(user, author):
+    """Отписывает user от author; True, если подписка была."""
+    deleted = _execute(
+        'DELETE FROM {follow} WHERE user_id = %s AND author_id = %s',
+        [user.pk, author.pk]
+    )
+    if deleted:
+        unfollowed(user, author)
+    return bool(deleted)
+
+
+def _chunks(pairs):
+    pairs = sorted({
+        (user_id, author_id) for user_id, author_id in pairs
+        if None not in (user_id, author_id) and user_id != author_id
+    })
+    for start in range(0, len(pairs), BULK_CHUNK):
+        yield pairs[start:start + BULK_CHUNK]
+
+
+def _existing(chunk):
+    """{(id подписчика, id автора): id подписки} для пар пачки, которые
+    уже есть в базе.
+    """
+    authors = defaultdict(list)
+    for user_id, author_id in chunk:
+        authors[user_id].append(author_id)
+    condition = Q()
+    for user_id, author_ids in authors.items():
+        condition |= Q(user_id=user_id, author_id__in=author_ids)
+    return {
+        (user_id, author_id): pk
+        for pk, user_id, author_id in Follow.objects.filter(
+            condition).values_list('pk', 'user_id', 'author_id')
+    }
+
+
+def _bulk_changed(chunk):
+    user_ids = {user_id for user_id, _ in chunk}
+    author_ids = {author_id for _, author_id in chunk}
+    recount_stats(author_ids, 'followers_count')
+    follow_graph.forget(user_ids)
+    for user_id in user_ids:
+        bump_timeline_modified(user_id)
+    page_cache.purge(*(
+        page_cache.profile_tag(username)
+        for username in User.objects.filter(
+            pk__in=user_ids | author_ids
+        ).values_list('username', flat=True)
+    ))
+    return user_ids, author_ids
+
+
+def follow_many(pairs):
+    """Подписки по парам (id подписчика, id автора) пачками через
+    bulk_create; существующие пары и подписки на себя пропускаются.
+    Возвращает число новых подписок.
+    """
+    total = 0
+    for chunk in _chunks(pairs):
+        # Чтение до транзакции: в SQLite транзакция, начатая чтением, не
+        # может стать пишущей, если другой запрос успел записать, и
+        # падает с «database is locked» без ожидания. Пара, добавленная
+        # между чтением и записью, пропускается INSERT OR IGNORE, а
+        # производные данные пересчитываются, а не сдвигаются.
+        existing = _existing(chunk)
+        added = [pair for pair in chunk if pair not in existing]
+        if not added:
+            continue
+        with transaction.atomic():
+            Follow.objects.bulk_create(
+                [
+                    Follow(user_id=user_id, author_id=author_id)
+                    for user_id, author_id in added
+                ],
+                ignore_conflicts=True
+            )
+            user_ids, author_ids = _bulk_changed(added)
+            timeline.promote(author_ids)
+            timeline.fill(author_ids, user_ids)
+        total += len(added)
+    return total
+
+
+def unfollow_many(pairs):
+    """Отписки по парам (id подписчика, id автора), один DELETE по id
+    существующих подписок на пачку.
+    """
+    for chunk in _chunks(pairs):
+        # Чтение до транзакции, как в follow_many.
+        existing = _existing(chunk)
+        if not existing:
+            continue
+        removed = list(existing)
+        with transaction.atomic():
+            _execute(
+                'DELETE FROM {{follow}} WHERE id IN ({})'.format(
+                    ', '.join(['%s'] * len(existing))),
+                list(existing.values())
+            )
+            _, author_ids = _bulk_changed(removed)
+            timeline.unfollow_many(removed)
+            timeline.demote(author_ids)
+
+
+def follow_group(user, group):
+    """Подписывает пользователя на всех авторов группы."""
+    authors = Post.objects.filter(
+        group=group, author__isnull=False
+    ).order_by().values_list('author_id', flat=True).distinct()
+    follow_many((user.pk, author_id) for author_id in authors)
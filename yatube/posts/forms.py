@@ -1,5 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from posts.images import transcode
 from posts.models import Post, Comment
+from posts.uploads import OversizedUpload
+from posts.validators import validate_file_size, validate_image_limits
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +11,29 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Содержимое файла больше предела не сохранено, и ImageField не
+        # должен открывать его как картинку: ошибку даёт clean_image.
+        self.oversized = self.files.get('image')
+        if isinstance(self.oversized, OversizedUpload):
+            self.files = self.files.copy()
+            del self.files['image']
+        else:
+            self.oversized = None
+        # Для списка групп нужны только id и заглавие, без описаний.
+        self.fields['group'].queryset = (
+            self.fields['group'].queryset.only('title'))
+
+    def clean_image(self):
+        if self.oversized is not None:
+            validate_file_size(self.oversized)
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        validate_image_limits(image)
+        return transcode(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
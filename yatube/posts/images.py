@@ -0,0 +1,91 @@
+"""Перекодирование загруженных картинок постов.
+
+Картинка уменьшается до POST_IMAGE_STORED_SIDE, теряет метаданные
+(EXIF, ICC, XMP) и сохраняется в первом доступном Pillow формате из
+POST_IMAGE_FORMATS.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+EXTENSIONS = {'AVIF': 'avif', 'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+CONTENT_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+METADATA_KEYS = {'exif', 'icc_profile', 'xmp', 'XML:com.adobe.xmp',
+                 'photoshop', 'comment'}
+
+
+def limit_pixels():
+    """Pillow предупреждает о картинке больше POST_IMAGE_MAX_PIXELS, а
+    вдвое большую не открывает даже в обход формы.
+    """
+    Image.MAX_IMAGE_PIXELS = settings.POST_IMAGE_MAX_PIXELS
+
+
+@receiver(setting_changed)
+def pixel_limit_changed(setting, **kwargs):
+    if setting == 'POST_IMAGE_MAX_PIXELS':
+        limit_pixels()
+
+
+def output_format():
+    Image.init()
+    for name in settings.POST_IMAGE_FORMATS:
+        if name in Image.SAVE:
+            return name
+    return 'JPEG'
+
+
+def transcode(upload):
+    """Возвращает перекодированную копию загрузки или саму загрузку,
+    если копия не меньше, а метаданных в исходнике нет.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        # Ошибка Pillow наступает только на удвоенном пределе.
+        raise Image.DecompressionBombError(
+            f'{width}x{height}: больше {settings.POST_IMAGE_MAX_PIXELS} '
+            'пикселей')
+    has_metadata = bool(METADATA_KEYS & set(image.info))
+    side = settings.POST_IMAGE_STORED_SIDE
+    # Для JPEG декодер сразу уменьшает картинку в 2-8 раз,
+    # не разворачивая в памяти полный кадр.
+    image.draft('RGB', (side, side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    name = output_format()
+    if name == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(
+        buffer, name, quality=settings.POST_IMAGE_QUALITY, optimize=True)
+    if buffer.tell() >= upload.size and not has_metadata:
+        upload.seek(0)
+        return upload
+    stem, _ = os.path.splitext(os.path.basename(upload.name))
+    return SimpleUploadedFile(
+        f'{stem}.{EXTENSIONS[name]}', buffer.getvalue(), CONTENT_TYPES[name])
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import page_cache
+from posts.feed_cache import bump_feed_version
+from posts.models import Post
+from posts.renditions import render_feed_image
+
+
+class Command(BaseCommand):
+    help = 'Строит копии картинок для лент у постов, где их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить копии у всех постов с картинками.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(feed_image_url='')
+        built = failed = 0
+        for post_id, image_name in posts.values_list('pk', 'image'):
+            if render_feed_image(post_id, image_name):
+                page_cache.purge_changed_post(post_id)
+                built += 1
+            else:
+                failed += 1
+        if built:
+            bump_feed_version()
+        self.stdout.write(f'Построено копий: {built}, с ошибкой: {failed}.')
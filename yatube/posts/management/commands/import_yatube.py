@@ -0,0 +1,472 @@
+import csv
+import itertools
+import json
+import sys
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import follows, page_cache, search, timeline
+from posts.feed_cache import bump_feed_version
+from posts.models import Comment, Group, ImportedPost, Post
+
+User = get_user_model()
+
+RECORD_TYPES = ('post', 'comment', 'follow')
+
+# Поля записей: обязательные и необязательные.
+FIELDS = {
+    'post': (('id', 'author', 'text'), ('group', 'pub_date')),
+    'comment': (('post', 'author', 'text'), ('created',)),
+    'follow': (('user', 'author'), ()),
+}
+
+LOOKUP_CHUNK = 500
+
+# Сколько соответствий id постов держать в памяти: когда их больше,
+# самые старые выбрасываются пачкой и при нужде снова читаются из
+# ImportedPost.
+CACHED_POST_IDS = 50000
+
+
+class Lookup:
+    """Кэш «имя → id» для пользователей или групп. Недостающие строки
+    ищутся и создаются пачками, каждая — одним запросом на пачку.
+    """
+
+    def __init__(self, model, field, make):
+        self.model = model
+        self.field = field
+        self.make = make
+        self.ids = {}
+
+    def resolve(self, names):
+        missing = list(set(names) - self.ids.keys())
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            chunk = missing[start:start + LOOKUP_CHUNK]
+            self._load(chunk)
+            absent = [name for name in chunk if name not in self.ids]
+            if absent:
+                self.model.objects.bulk_create(
+                    self.make(name) for name in absent)
+                self._load(absent)
+
+    def _load(self, names):
+        self.ids.update(self.model.objects.filter(
+            **{f'{self.field}__in': names}
+        ).values_list(self.field, 'pk'))
+
+    def __getitem__(self, name):
+        return self.ids[name]
+
+
+class WaitingComments:
+    """Комментарии, чей пост ещё не встретился, во временной таблице
+    соединения: буфер в памяти перебирался бы на каждую пачку целиком.
+    Комментарии достаются из таблицы по id только что записанных постов.
+    """
+    table = 'import_waiting_comment'
+    columns = ('line', 'post', 'author', 'text', 'created')
+
+    def __init__(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {self.table} ('
+                'line integer NOT NULL, post integer NOT NULL, '
+                'author varchar(150) NOT NULL, text text NOT NULL, '
+                'created varchar(40) NULL)'
+            )
+            cursor.execute(
+                f'CREATE INDEX {self.table}_post ON {self.table} (post)')
+
+    def add(self, records):
+        if not records:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} ({", ".join(self.columns)}) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [
+                    (
+                        record['line'], record['post'], record['author'],
+                        record['text'],
+                        record['created'] and record['created'].isoformat(),
+                    )
+                    for record in records
+                ]
+            )
+
+    def take(self, post_ids):
+        """Достаёт из таблицы комментарии к постам с этими id."""
+        post_ids = sorted(post_ids)
+        records = []
+        with connection.cursor() as cursor:
+            for start in range(0, len(post_ids), LOOKUP_CHUNK):
+                chunk = post_ids[start:start + LOOKUP_CHUNK]
+                condition = 'post IN ({})'.format(
+                    ', '.join(['%s'] * len(chunk)))
+                cursor.execute(
+                    f'SELECT {", ".join(self.columns)} FROM {self.table} '
+                    f'WHERE {condition}', chunk)
+                for row in cursor.fetchall():
+                    record = dict(zip(self.columns, row))
+                    record['created'] = (
+                        record['created']
+                        and parse_datetime(record['created']))
+                    records.append(record)
+                cursor.execute(
+                    f'DELETE FROM {self.table} WHERE {condition}', chunk)
+        return records
+
+    def lines(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT line FROM {self.table} ORDER BY line')
+            return [line for line, in cursor.fetchall()]
+
+    def drop(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {self.table}')
+
+
+@contextmanager
+def keep_dates(*fields):
+    """bulk_create заменяет даты полей с auto_now_add текущим временем;
+    импорт сохраняет даты из исходной площадки.
+    """
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def read_jsonl(file):
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            raise CommandError(f'Строка {number}: {error}')
+
+
+def read_csv(file, record_type):
+    # Первая строка — заголовок с именами полей.
+    for number, row in enumerate(csv.DictReader(file), 2):
+        row.setdefault('type', record_type)
+        yield number, row
+
+
+def parse_date(number, value):
+    if not value:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise CommandError(f'Строка {number}: неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def parse_record(number, record):
+    """Проверяет запись и приводит её поля к нужным типам."""
+    record_type = record.get('type')
+    if record_type not in FIELDS:
+        raise CommandError(
+            f'Строка {number}: неизвестный тип записи {record_type!r}')
+    required, optional = FIELDS[record_type]
+    missing = [name for name in required if not record.get(name)]
+    if missing:
+        raise CommandError(
+            f'Строка {number}: нет полей {", ".join(missing)}')
+    parsed = {name: record.get(name) or None for name in required + optional}
+    try:
+        for name in ('id', 'post'):
+            if name in parsed:
+                parsed[name] = int(parsed[name])
+    except ValueError as error:
+        raise CommandError(f'Строка {number}: {error}')
+    for name in ('pub_date', 'created'):
+        if name in parsed:
+            parsed[name] = parse_date(number, parsed[name])
+    parsed['line'] = number
+    return record_type, parsed
+
+
+class Importer:
+    """Копит записи и пишет их пачками, по транзакции на пачку.
+
+    Посты получают id сразу, следующие за наибольшим id в базе, а
+    соответствие их id во входных данных и в базе хранится в
+    ImportedPost. Комментарий ждёт во временной таблице, пока не
+    записан его пост, поэтому порядок записей в файле не важен.
+    Повторный импорт того же файла пропускает уже записанные посты,
+    комментарии и подписки.
+    Пока идёт импорт, новые посты и комментарии на сайте создаваться
+    не должны.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.users = Lookup(User, 'username', lambda username: User(
+            username=username, password=make_password(None)))
+        self.groups = Lookup(Group, 'slug', lambda slug: Group(
+            slug=slug, title=slug, description=''))
+        self.post_ids = {}
+        self.next_post_id = (
+            Post.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        self.next_comment_id = (
+            Comment.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        self.buffers = {record_type: [] for record_type in RECORD_TYPES}
+        self.counts = dict.fromkeys(RECORD_TYPES, 0)
+        self.touched_authors = set()
+        self.committed = False
+        self.waiting = WaitingComments()
+
+    def add(self, record_type, record):
+        buffer = self.buffers[record_type]
+        buffer.append(record)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        before = sum(self.counts.values())
+        with transaction.atomic():
+            written = self.write_posts(self.buffers['post'])
+            self.write_comments(self.buffers['comment'])
+            # Ждавшие комментарии перебираются, только когда записаны
+            # новые посты, и только те, что относятся к ним.
+            if written:
+                self.write_comments(self.waiting.take(written))
+            self.write_follows(self.buffers['follow'])
+        if sum(self.counts.values()) > before:
+            self.committed = True
+        for buffer in self.buffers.values():
+            buffer.clear()
+        self.evict_post_ids()
+
+    def evict_post_ids(self):
+        excess = len(self.post_ids) - CACHED_POST_IDS
+        if excess > 0:
+            # Выбрасывается половина, чтобы не чистить на каждой пачке.
+            for source_id in list(itertools.islice(
+                    self.post_ids, excess + CACHED_POST_IDS // 2)):
+                del self.post_ids[source_id]
+
+    def resolve_posts(self, source_ids):
+        missing = sorted(set(source_ids) - self.post_ids.keys())
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            self.post_ids.update(ImportedPost.objects.filter(
+                source_id__in=missing[start:start + LOOKUP_CHUNK]
+            ).values_list('source_id', 'post_id'))
+
+    def write_posts(self, records):
+        """Пишет посты, кроме записанных прежним импортом; возвращает их
+        id во входных данных.
+        """
+        self.resolve_posts(record['id'] for record in records)
+        records = [
+            record for record in records if record['id'] not in self.post_ids
+        ]
+        if not records:
+            return []
+        self.users.resolve(record['author'] for record in records)
+        self.groups.resolve(
+            record['group'] for record in records if record['group'])
+        posts = []
+        imported = []
+        written = []
+        for record in records:
+            if record['id'] in self.post_ids:
+                continue
+            imported.append(ImportedPost(
+                source_id=record['id'], post_id=self.next_post_id))
+            posts.append(Post(
+                pk=self.next_post_id,
+                author_id=self.users[record['author']],
+                group_id=record['group'] and self.groups[record['group']],
+                text=record['text'],
+                pub_date=record['pub_date'] or timezone.now(),
+            ))
+            self.post_ids[record['id']] = self.next_post_id
+            self.next_post_id += 1
+            written.append(record['id'])
+        Post.objects.bulk_create(posts)
+        ImportedPost.objects.bulk_create(imported)
+        search.index_posts((post.pk, post.text) for post in posts)
+        self.touched_authors.update(post.author_id for post in posts)
+        self.counts['post'] += len(posts)
+        return written
+
+    def write_comments(self, records):
+        """Пишет комментарии к уже записанным постам, кроме записанных
+        прежним импортом; комментарии, чей пост ещё не встретился,
+        откладывает во временную таблицу.
+        """
+        self.resolve_posts(record['post'] for record in records)
+        self.waiting.add([
+            record for record in records
+            if record['post'] not in self.post_ids
+        ])
+        records = [
+            record for record in records
+            if record['post'] in self.post_ids
+        ]
+        if not records:
+            return
+        self.users.resolve(record['author'] for record in records)
+        post_ids = sorted({self.post_ids[record['post']]
+                           for record in records})
+        # Без даты в исходных данных комментарий сравнивается с прежним
+        # импортом по посту, автору и тексту.
+        dated, undated = set(), set()
+        for start in range(0, len(post_ids), LOOKUP_CHUNK):
+            for key in Comment.objects.filter(
+                post_id__in=post_ids[start:start + LOOKUP_CHUNK]
+            ).values_list('post_id', 'author_id', 'text', 'created'):
+                dated.add(key)
+                undated.add(key[:3])
+        comments = []
+        for record in records:
+            key = (self.post_ids[record['post']],
+                   self.users[record['author']], record['text'])
+            if record['created'] is None:
+                if key in undated:
+                    continue
+            elif key + (record['created'],) in dated:
+                continue
+            else:
+                dated.add(key + (record['created'],))
+            comments.append(Comment(
+                pk=self.next_comment_id,
+                post_id=key[0],
+                author_id=key[1],
+                text=record['text'],
+                created=record['created'] or timezone.now(),
+            ))
+            self.next_comment_id += 1
+        Comment.objects.bulk_create(comments)
+        search.index_comments(
+            (comment.pk, comment.text, comment.post_id)
+            for comment in comments
+        )
+        self.counts['comment'] += len(comments)
+
+    def write_follows(self, records):
+        if not records:
+            return
+        self.users.resolve(
+            name for record in records
+            for name in (record['user'], record['author'])
+        )
+        self.counts['follow'] += follows.follow_many(
+            (self.users[record['user']], self.users[record['author']])
+            for record in records
+        )
+
+    def finish(self):
+        """Пишет последнюю пачку; ошибка, если остались комментарии без
+        постов.
+        """
+        self.flush()
+        lines = ', '.join(str(line) for line in self.waiting.lines())
+        if lines:
+            raise CommandError(
+                f'Строки {lines}: комментарии к постам, которых нет '
+                'ни во входных данных, ни в прежних импортах')
+
+    def close(self):
+        """Досчитывает для записанных пачек то, что при обычной записи
+        делают сигналы: счётчики авторов, ленты подписчиков новых постов
+        и сброс кэшей. Вызывается и когда импорт оборвался на середине
+        файла: записанные пачки остаются в базе. Подписки досчитывает
+        follows.follow_many на каждую пачку.
+        """
+        try:
+            if self.committed:
+                self.rebuild()
+        finally:
+            self.waiting.drop()
+
+    def rebuild(self):
+        sequences = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment])
+        with connection.cursor() as cursor:
+            for statement in sequences:
+                cursor.execute(statement)
+        call_command('rebuild_author_stats', stdout=StringIO())
+        timeline.fill(self.touched_authors)
+        bump_feed_version()
+        page_cache.purge(page_cache.ALL)
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты, комментарии и подписки из JSONL или CSV '
+            'пачками через bulk_create. Авторы и группы ищутся по '
+            'username и slug, недостающие создаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с записями или «-» для чтения из stdin.')
+        parser.add_argument(
+            '--format',
+            choices=('jsonl', 'csv'),
+            help='По умолчанию по расширению файла.'
+        )
+        parser.add_argument(
+            '--type',
+            choices=RECORD_TYPES,
+            help='Тип записей CSV-файла, если в нём нет колонки type.'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl')
+        if path == '-':
+            file = sys.stdin
+        else:
+            file = open(path, encoding='utf-8', newline='')
+        started = time.perf_counter()
+        importer = Importer(options['batch_size'])
+        try:
+            if data_format == 'csv':
+                records = read_csv(file, options['type'])
+            else:
+                records = read_jsonl(file)
+            with keep_dates(
+                Post._meta.get_field('pub_date'),
+                Comment._meta.get_field('created'),
+            ):
+                for number, record in records:
+                    importer.add(*parse_record(number, record))
+                importer.finish()
+        except DatabaseError as error:
+            raise CommandError(f'Пачка не записана: {error}')
+        finally:
+            try:
+                importer.close()
+            finally:
+                if file is not sys.stdin:
+                    file.close()
+        elapsed = time.perf_counter() - started
+        counts = importer.counts
+        self.stdout.write(
+            f'Импортировано постов: {counts["post"]}, комментариев: '
+            f'{counts["comment"]}, подписок: {counts["follow"]} '
+            f'за {elapsed:.1f} с.'
+        )
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from posts import timeline
+from posts.author_stats import COUNTED
+from posts.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики авторов или проверяет их.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счётчики, ничего не записывая.'
+        )
+
+    def handle(self, *args, **options):
+        actual = {}
+        for field, manager_filter in COUNTED.items():
+            counts = (
+                manager_filter(author__isnull=False)
+                .order_by()
+                .values_list('author')
+                .annotate(total=Count('pk'))
+            )
+            for author_id, total in counts:
+                actual.setdefault(author_id, dict.fromkeys(COUNTED, 0))
+                actual[author_id][field] = total
+        stored = {
+            row.pop('author_id'): row
+            for row in AuthorStats.objects.values('author_id', *COUNTED)
+        }
+        empty = dict.fromkeys(COUNTED, 0)
+        mismatched = {
+            author_id for author_id in actual.keys() | stored.keys()
+            if actual.get(author_id, empty) != stored.get(author_id, empty)
+        }
+        if options['check']:
+            if mismatched:
+                raise CommandError(
+                    f'Расходятся счётчики у авторов: {sorted(mismatched)}')
+            self.stdout.write('Счётчики авторов сходятся.')
+            return
+        with transaction.atomic():
+            AuthorStats.objects.filter(pk__in=[
+                author_id for author_id in mismatched
+                if author_id not in actual
+            ]).delete()
+            for author_id in mismatched:
+                if author_id in actual:
+                    AuthorStats.objects.update_or_create(
+                        author_id=author_id, defaults=actual[author_id])
+            timeline.promote()
+            timeline.demote()
+        self.stdout.write(f'Исправлено счётчиков: {len(mismatched)}.')
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+
+from posts import page_cache
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимным читателям страницы лент и постов из кэша.
+
+    Стоит первым в MIDDLEWARE: попадание в кэш не проходит через
+    сессии, аутентификацию, CSRF, ORM и шаблоны. Запрос с cookie сессии
+    и ответы, которые ставят cookie или помечены private, мимо кэша.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return self.get_response(request)
+        tags = page_cache.request_tags(request)
+        if tags is None:
+            return self.get_response(request)
+        response = page_cache.get_or_render(
+            request,
+            tags,
+            lambda: self.get_response(request),
+            store_if=self.cacheable,
+        )
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            response=response,
+        )
+
+    @staticmethod
+    def cacheable(response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='feed_image_url',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Картинка для ленты'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+FOLD = str.maketrans('ёЁ', 'еЕ')
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE VIRTUAL TABLE posts_search USING fts5('
+            'body, post_id UNINDEXED, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        # Генераторы вместо списков: executemany читает строки по одной,
+        # и таблицы не загружаются в память целиком.
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, body, post_id) '
+            'VALUES (%s, %s, %s)',
+            (
+                [post_id * 2, text.translate(FOLD), post_id]
+                for post_id, text
+                in Post.objects.values_list('pk', 'text').iterator()
+            )
+        )
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, body, post_id) '
+            'VALUES (%s, %s, %s)',
+            (
+                [comment_id * 2 + 1, text.translate(FOLD), post_id]
+                for comment_id, text, post_id
+                in Comment.objects.filter(post__isnull=False).values_list(
+                    'pk', 'text', 'post_id').iterator()
+            )
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_feed_image_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
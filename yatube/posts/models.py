@@ -1,5 +1,10 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Min
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from .validators import validate_not_empty
 
 
@@ -28,6 +33,88 @@ class Group(models.Model):
         return self.title
 
 
+def _period_start(value, kind, tzinfo):
+    if tzinfo is not None:
+        value = timezone.make_naive(value, tzinfo)
+    if isinstance(value, datetime):
+        value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind in ('year', 'month'):
+        value = value.replace(day=1)
+    if kind == 'year':
+        value = value.replace(month=1)
+    return value
+
+
+def _next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+class DateProbeQuerySet(models.QuerySet):
+    """dates() и datetimes() по годам, месяцам и дням находят периоды
+    пробами по индексу даты: MIN() с условием «не раньше начала
+    следующего периода» на каждый найденный период. Встроенные методы
+    делают DISTINCT по всем строкам выборки, а их зовёт date_hierarchy
+    админки. Методы возвращают списки, поэтому набор подключается
+    только менеджером date_probes, через который читает админка.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        field = self.model._meta.get_field(field_name)
+        if not isinstance(field, models.DateTimeField):
+            return self._probe(field_name, kind, order, None)
+        # Как и встроенный dates(), даты берутся по UTC.
+        tzinfo = timezone.utc if settings.USE_TZ else None
+        return [
+            start.date()
+            for start in self._probe(field_name, kind, order, tzinfo)
+        ]
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        if settings.USE_TZ:
+            tzinfo = tzinfo or timezone.get_current_timezone()
+        else:
+            tzinfo = None
+        return self._probe(field_name, kind, order, tzinfo)
+
+    def _probe(self, field_name, kind, order, tzinfo):
+        queryset = self.order_by()
+        periods = []
+        first = queryset.aggregate(first=Min(field_name))['first']
+        while first is not None:
+            start = _period_start(first, kind, tzinfo)
+            end = _next_period(start, kind)
+            if tzinfo is not None:
+                start = timezone.make_aware(start, tzinfo)
+                end = timezone.make_aware(end, tzinfo)
+            periods.append(start)
+            first = queryset.filter(
+                **{f'{field_name}__gte': end}
+            ).aggregate(first=Min(field_name))['first']
+        if order == 'DESC':
+            periods.reverse()
+        return periods
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты с автором и группой одним запросом, только нужные
+        шаблонам колонки.
+        """
+        return self.select_related('author', 'group').only(
+            'pub_date', 'text', 'image', 'feed_image_url',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__slug', 'group__title',
+        )
+
+
 class Post(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True,
@@ -61,13 +148,44 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    feed_image_url = models.CharField(
+        'Картинка для ленты',
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
+    date_probes = DateProbeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем автора из базы, чтобы при смене автора
+        # пересчитать счётчики обоих пользователей.
+        if 'author_id' in instance.__dict__:
+            instance._loaded_author_id = instance.author_id
+        if 'image' in instance.__dict__:
+            instance._loaded_image = instance.image.name or ''
+        return instance
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -90,6 +208,19 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = models.Manager()
+    date_probes = DateProbeQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx'),
+            models.Index(
+                fields=('-created', '-id'),
+                name='comment_created_idx'),
+        )
+
     def __str__(self):
         return self.text[:15]
 
@@ -115,6 +246,97 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=('user', 'author'), name='one_follow'),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'),
+        )
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
+    celebrity = models.BooleanField(
+        default=False,
+        verbose_name='Популярный автор'
+    )
+
+    def __str__(self):
+        return f'{self.author}: {self.posts_count}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='one_timeline_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_date_idx'),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class ImportedPost(models.Model):
+    """Соответствие id поста в исходной площадке и в базе: повторный
+    импорт того же файла не создаёт постов заново, а комментарии
+    находят свой пост, записанный в любой из пачек.
+    """
+    source_id = models.PositiveIntegerField(
+        unique=True,
+        verbose_name='Id в исходной площадке'
+    )
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост'
+    )
+
+    def __str__(self):
+        return f'{self.source_id} → {self.post_id}'
@@ -0,0 +1,114 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Поколение страницы складывается из поколений её тегов: лента index,
+группа, профиль автора, пост. Сигналы сбрасывают только теги, которых
+коснулось изменение, остальные страницы остаются в кэше.
+"""
+import hashlib
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from core.stampede import get_or_compute
+from posts.feed_cache import bump_version, get_version
+
+TAG_KEY = 'posts:page_tag:{}'
+ALL = 'all'
+INDEX = 'index'
+INDEX_FIRST_PAGE = 'index:1'
+GROUPS = 'groups'
+PROFILES = 'profiles'
+
+
+def group_tag(slug):
+    return f'group:{slug}'
+
+
+def profile_tag(username):
+    return f'profile:{username}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def is_first_page(request):
+    """Первая страница ленты: без курсора и без ?page, с ?page=1 или с
+    нечисловым ?page, вместо которого Paginator.get_page отдаёт первую.
+    """
+    if 'cursor' in request.GET:
+        return False
+    try:
+        return int(request.GET.get('page', 1)) == 1
+    except ValueError:
+        return True
+
+
+def request_tags(request):
+    """Теги страницы или None, если страница не кэшируется."""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    name = match.view_name
+    if name == 'posts:index':
+        tags = [INDEX]
+        if is_first_page(request):
+            tags.append(INDEX_FIRST_PAGE)
+    elif name == 'posts:slug':
+        tags = [GROUPS, group_tag(match.kwargs['slug'])]
+    elif name == 'posts:profile':
+        tags = [PROFILES, profile_tag(match.kwargs['username'])]
+    elif name == 'posts:post_detail':
+        tags = [post_tag(match.kwargs['post_id'])]
+    else:
+        return None
+    return [ALL] + tags
+
+
+def page_key(request):
+    raw = request.get_full_path()
+    return 'posts:page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_version(tags):
+    """Поколение страницы: поколения всех её тегов."""
+    return tuple(get_version(TAG_KEY.format(tag)) for tag in tags)
+
+
+def get_or_render(request, tags, render, store_if):
+    """Страница из кэша; после сброса тегов её заново рендерит один
+    запрос, остальные до конца рендера получают прежнюю версию.
+    """
+    return get_or_compute(
+        page_key(request),
+        render,
+        settings.PAGE_CACHE_TIMEOUT,
+        version=page_version(tags),
+        store_if=store_if,
+        name='page',
+    )
+
+
+def purge(*tags):
+    """Делает недоступными все закэшированные страницы с этими тегами."""
+    for tag in tags:
+        bump_version(TAG_KEY.format(tag))
+
+
+def purge_new_post(post):
+    """Новый пост появляется на первой странице index, в группе и в
+    профиле автора; id поста сбрасывается на случай его повторного
+    использования после удаления.
+    """
+    tags = [INDEX_FIRST_PAGE, post_tag(post.pk)]
+    if post.group_id is not None:
+        tags.append(group_tag(post.group.slug))
+    if post.author_id is not None:
+        tags.append(profile_tag(post.author.username))
+    purge(*tags)
+
+
+def purge_changed_post(post_id):
+    """Правка или удаление поста может задеть любую страницу лент."""
+    purge(INDEX, GROUPS, PROFILES, post_tag(post_id))
@@ -0,0 +1,168 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from yatube.settings import PAGE_NUM
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, obj, date_field='pub_date'):
+    """Упаковывает ключ (дата, id) объекта в непрозрачный токен."""
+    date = getattr(obj, date_field)
+    raw = f'{direction}|{date.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора, для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+def seek(queryset, cursor, limit, date_field='pub_date', pk_field='pk',
+         newest_first=True):
+    """Range-чтение строк за курсором: для NEXT и без курсора в порядке
+    ленты (по умолчанию от новых к старым), для PREVIOUS — в обратном.
+    """
+    direction = NEXT if cursor is None else cursor[0]
+    descending = (direction == NEXT) == newest_first
+    if cursor is not None:
+        _, date, pk = cursor
+        lookup = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{lookup}': date})
+            | Q(**{date_field: date, f'{pk_field}__{lookup}': pk})
+        )
+    if descending:
+        ordering = ('-' + date_field, '-' + pk_field)
+    else:
+        ordering = (date_field, pk_field)
+    return list(queryset.order_by(*ordering)[:limit])
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (дата, id) без COUNT(*) и OFFSET.
+
+    Номера страниц в этом режиме условные: Page.has_next() и
+    Page.has_previous() сравнивают номер с num_pages, поэтому номер
+    и число страниц вычисляются из наличия соседних страниц.
+    """
+    is_cursor = True
+    date_field = 'pub_date'
+    newest_first = True
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True):
+        super().__init__(object_list, per_page, orphans,
+                         allow_empty_first_page)
+        self.has_next = False
+        self.has_previous = False
+
+    @property
+    def num_pages(self):
+        return 1 + self.has_previous + self.has_next
+
+    def fetch(self, cursor, limit):
+        """До limit объектов за курсором в порядке обхода."""
+        return seek(self.object_list, cursor, limit,
+                    date_field=self.date_field,
+                    newest_first=self.newest_first)
+
+    def page_by_cursor(self, token=None):
+        cursor = decode_cursor(token) if token else None
+        rows = self.fetch(cursor, self.per_page + 1)
+        extra = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        # Соседняя страница за курсором есть, только если на этой есть
+        # граничная строка, от которой строится ссылка: курсор за краем
+        # ленты даёт пустую страницу без ссылок.
+        if cursor is None:
+            self.has_next = extra
+        elif cursor[0] == NEXT:
+            self.has_previous = bool(rows)
+            self.has_next = extra
+        else:
+            self.has_next = bool(rows)
+            self.has_previous = extra
+            rows = rows[::-1]
+        page = Page(rows, 1 + self.has_previous, self)
+        page.next_cursor = (
+            encode_cursor(NEXT, rows[-1], self.date_field)
+            if self.has_next else None)
+        page.previous_cursor = (
+            encode_cursor(PREVIOUS, rows[0], self.date_field)
+            if self.has_previous else None)
+        return page
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста по (created, id), от старых к новым."""
+    date_field = 'created'
+    newest_first = False
+
+
+def get_page_obj(request, queryset, per_page=PAGE_NUM,
+                 paginator_class=CursorPaginator, numbered=True):
+    """Страница ленты: курсорная, либо старая нумерованная для ?page=N.
+
+    С numbered=False ?page=N не поддерживается и открывается первая
+    курсорная страница.
+    """
+    if numbered and 'page' in request.GET and 'cursor' not in request.GET:
+        paginator = Paginator(queryset, per_page)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = paginator_class(queryset, per_page)
+    return paginator.page_by_cursor(request.GET.get('cursor'))
+
+
+def estimate_rows(queryset):
+    """Оценка числа строк таблицы без её обхода."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return max(int(row[0]), 0) if row else 0
+    # Наибольший id — оценка сверху, точная, пока строки не удаляли;
+    # по первичному ключу это один шаг.
+    return queryset.model._default_manager.using(queryset.db).aggregate(
+        top=Max('pk'))['top'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator админки без COUNT(*) по большим таблицам.
+
+    Без фильтров число строк больше ADMIN_COUNT_LIMIT берётся из
+    оценки; с фильтрами строки считаются не дальше ADMIN_COUNT_LIMIT,
+    и страниц не больше, чем помещается в этот предел.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset)
+            if estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
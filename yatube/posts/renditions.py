@@ -0,0 +1,119 @@
+"""Заранее подготовленные копии картинок постов для лент.
+
+Копия 960x339 строится в фоновом пуле процессов после сохранения поста,
+её адрес хранится в Post.feed_image_url, поэтому шаблонам лент не нужны
+ни Pillow, ни хранилище ключей sorl-thumbnail.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from core import metrics
+from posts import page_cache
+from posts.feed_cache import bump_feed_version
+
+logger = logging.getLogger(__name__)
+
+FEED_SIZE = (960, 339)
+
+_executor = None
+
+
+def _forget_connections():
+    # Соединения с БД, унаследованные от родителя при fork, нельзя
+    # использовать в дочернем процессе: пусть Django откроет свои.
+    for connection in connections.all():
+        connection.connection = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.RENDITION_WORKERS,
+            initializer=_forget_connections
+        )
+    return _executor
+
+
+def rendition_name(image_name):
+    stem, _ = os.path.splitext(image_name)
+    return 'renditions/{}x{}/{}.jpg'.format(*FEED_SIZE, stem)
+
+
+def render_feed_image(post_id, image_name):
+    """Строит копию картинки для ленты и записывает её адрес в пост.
+
+    Возвращает адрес копии или None, если картинку не удалось обработать.
+    """
+    from posts.models import Post
+
+    started = time.perf_counter()
+    try:
+        with default_storage.open(image_name) as source:
+            image = Image.open(source)
+            image = ImageOps.fit(
+                image.convert('RGB'), FEED_SIZE, Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85, optimize=True)
+        name = rendition_name(image_name)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        name = default_storage.save(name, ContentFile(buffer.getvalue()))
+    except Exception:
+        logger.exception('Не удалось построить копию %s', image_name)
+        observe_rendition(started, 'error')
+        return None
+    observe_rendition(started, 'ok')
+    url = default_storage.url(name)
+    # Картинку могли заменить, пока строилась копия старой.
+    Post.objects.filter(pk=post_id, image=image_name).update(
+        feed_image_url=url)
+    return url
+
+
+def observe_rendition(started, status):
+    # Копии строятся в дочерних процессах пула, которые не обслуживают
+    # запросов: итоги записываются сразу, а не раз в интервал.
+    metrics.RENDITION_DURATION.observe(
+        time.perf_counter() - started, status=status)
+    metrics.REGISTRY.flush()
+
+
+def _rendered(post_id, future):
+    if future.exception() is None and future.result():
+        bump_feed_version()
+        page_cache.purge_changed_post(post_id)
+
+
+def schedule(post):
+    """Ставит построение копии картинки поста в очередь.
+
+    При RENDITION_WORKERS = 0 копия строится сразу в текущем процессе.
+    """
+    if not post.image:
+        return
+    post_id, image_name = post.pk, post.image.name
+    if not settings.RENDITION_WORKERS:
+        url = render_feed_image(post_id, image_name)
+        if url:
+            post.feed_image_url = url
+            bump_feed_version()
+            page_cache.purge_changed_post(post_id)
+        return
+
+    def submit():
+        future = get_executor().submit(
+            render_feed_image, post_id, image_name)
+        future.add_done_callback(partial(_rendered, post_id))
+
+    transaction.on_commit(submit)
@@ -0,0 +1,271 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+В таблице posts_search по строке на пост и на комментарий; rowid кодирует
+вид документа, чтобы обновлять и удалять строку без поиска по колонкам.
+Результат поиска — посты, ранжированные по лучшему bm25 среди самого
+поста и его комментариев; ранжируются только самые новые совпадения.
+unicode61 не сводит «ё» к «е», поэтому текст нормализуется перед
+индексацией и в запросе.
+"""
+import base64
+import binascii
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from posts.models import Comment, Post
+
+POST, COMMENT = 0, 1
+WORD = re.compile(r'\w+')
+FOLD = str.maketrans('ёЁ', 'еЕ')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def normalize(text):
+    return text.translate(FOLD)
+
+
+def _rowid(kind, object_id):
+    return object_id * 2 + kind
+
+
+UPSERT = (
+    'INSERT OR REPLACE INTO posts_search (rowid, body, post_id) '
+    'VALUES (%s, %s, %s)'
+)
+
+
+def _index(kind, object_id, post_id, body):
+    if not available():
+        return
+    if post_id is None:
+        _unindex([_rowid(kind, object_id)])
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT, [_rowid(kind, object_id), normalize(body), post_id])
+
+
+def _unindex(rowids):
+    if not available() or not rowids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'DELETE FROM posts_search WHERE rowid = %s',
+            [[rowid] for rowid in rowids]
+        )
+
+
+def index_post(post):
+    _index(POST, post.pk, post.pk, post.text)
+
+
+def index_comment(comment):
+    _index(COMMENT, comment.pk, comment.post_id, comment.text)
+
+
+def unindex_post(post_id, comment_ids=()):
+    _unindex([_rowid(POST, post_id)] + [
+        _rowid(COMMENT, comment_id) for comment_id in comment_ids])
+
+
+def unindex_comment(comment_id):
+    _unindex([_rowid(COMMENT, comment_id)])
+
+
+def index_posts(rows):
+    """Индексирует посты пачкой; rows — пары (id, текст)."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(UPSERT, (
+            [_rowid(POST, pk), normalize(text), pk] for pk, text in rows))
+
+
+def index_comments(rows):
+    """Индексирует комментарии пачкой; rows — (id, текст, id поста)."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(UPSERT, (
+            [_rowid(COMMENT, pk), normalize(text), post_id]
+            for pk, text, post_id in rows
+        ))
+
+
+def reindex():
+    """Строит индекс заново, например после bulk_create, который не
+    отправляет сигналов.
+    """
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM posts_search')
+    index_posts(Post.objects.values_list('pk', 'text').iterator())
+    index_comments(Comment.objects.filter(
+        post__isnull=False
+    ).values_list('pk', 'text', 'post_id').iterator())
+
+
+def match_expression(query, prefix=False):
+    """Слова запроса в кавычках: пользовательский ввод не разбирается
+    как синтаксис FTS5, а все слова должны встретиться в документе.
+    С prefix слово совпадает и с началом слова документа.
+    """
+    star = '*' if prefix else ''
+    return ' '.join(
+        f'"{word}"{star}' for word in WORD.findall(normalize(query)))
+
+
+class IdSubquery(RawSQL):
+    """Подзапрос для __in. Lookup в Django 2.2 сам берёт выражение в
+    скобки, а со скобками RawSQL получилось бы IN ((SELECT ...)), и
+    SQLite взял бы только первую строку.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def matching_ids(query, kind, prefix=False):
+    """Подзапрос id постов (POST) или комментариев (COMMENT), в тексте
+    которых есть все слова запроса; None, если индекса нет или в
+    запросе нет слов.
+    """
+    expression = match_expression(query, prefix)
+    if not available() or not expression:
+        return None
+    return IdSubquery(
+        'SELECT (rowid - %s) / 2 FROM posts_search '
+        'WHERE posts_search MATCH %s AND rowid %% 2 = %s',
+        [kind, expression, kind]
+    )
+
+
+# Ранжируются только CANDIDATES самых новых совпавших документов:
+# bm25 по всем совпадениям частого слова считался бы сотни миллисекунд.
+CANDIDATES = 10000
+
+# Документов за один проход на каждый пост страницы: у поста бывает
+# несколько совпавших комментариев.
+OVERFETCH = 3
+
+
+def encode_cursor(score, rowid, floor):
+    raw = f'{score!r}|{rowid}|{floor}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        score, rowid, floor = base64.urlsafe_b64decode(
+            padded.encode()).decode().split('|')
+        return float(score), int(rowid), int(floor)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _ranked(expression, floor, after, limit):
+    """Документы-кандидаты за позицией after = (оценка, rowid) по
+    возрастанию bm25: строки (rowid, id поста, оценка, нижняя граница
+    rowid кандидатов). Без floor граница находится тем же запросом.
+    """
+    if floor is None:
+        sql = (
+            'WITH bound AS (SELECT MIN(rowid) AS floor FROM ('
+            'SELECT rowid FROM posts_search WHERE posts_search MATCH %s '
+            'ORDER BY rowid DESC LIMIT %s)) '
+            'SELECT posts_search.rowid, post_id, rank, bound.floor '
+            'FROM bound, posts_search WHERE posts_search MATCH %s '
+            'AND posts_search.rowid >= bound.floor'
+        )
+        params = [expression, CANDIDATES, expression]
+    else:
+        sql = (
+            'SELECT rowid, post_id, rank, %s FROM posts_search '
+            'WHERE posts_search MATCH %s AND rowid >= %s'
+        )
+        params = [floor, expression, floor]
+    if after is not None:
+        sql += (' AND (rank > %s OR (rank = %s '
+                'AND posts_search.rowid > %s))')
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY rank, posts_search.rowid LIMIT %s'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+
+def _shown_before(expression, floor, position, post_ids):
+    """Посты из post_ids, у которых есть документ не дальше position:
+    они уже показаны на прежних страницах.
+    """
+    post_ids = list(post_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT DISTINCT post_id FROM posts_search '
+            'WHERE posts_search MATCH %s AND rowid >= %s '
+            'AND post_id IN ({}) '
+            'AND (rank < %s OR (rank = %s AND rowid <= %s))'.format(
+                ', '.join(['%s'] * len(post_ids))),
+            [expression, floor, *post_ids,
+             position[0], position[0], position[1]]
+        )
+        return {post_id for post_id, in cursor.fetchall()}
+
+
+def search(query, cursor=None, limit=10):
+    """Возвращает посты страницы результатов и курсор следующей.
+
+    Документы читаются по возрастанию bm25 через ORDER BY rank LIMIT
+    пачками, а пост встаёт в выдачу по лучшему из своих документов:
+    повторы отбрасываются здесь, а не группировкой всех совпадений.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    if not available():
+        posts = list(Post.objects.for_feed().filter(
+            text__icontains=query)[:limit])
+        return posts, None
+    floor = position = None
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is not None:
+            position, floor = decoded[:2], decoded[2]
+    ranked = {}
+    seen = set()
+    after = position
+    batch = (limit + 1) * OVERFETCH
+    while len(ranked) <= limit:
+        rows = _ranked(expression, floor, after, batch)
+        if not rows:
+            break
+        floor = rows[0][3]
+        new = {}
+        for rowid, post_id, score, _ in rows:
+            if post_id not in seen:
+                seen.add(post_id)
+                new[post_id] = (score, rowid)
+        if position is not None and new:
+            for post_id in _shown_before(expression, floor, position, new):
+                del new[post_id]
+        ranked.update(new)
+        if len(rows) < batch:
+            break
+        after = rows[-1][2], rows[-1][0]
+    ranked = list(ranked.items())
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        score, rowid = ranked[-1][1]
+        next_cursor = encode_cursor(score, rowid, floor)
+    found = Post.objects.for_feed().in_bulk(
+        [post_id for post_id, _ in ranked])
+    posts = [found[post_id] for post_id, _ in ranked if post_id in found]
+    return posts, next_cursor
@@ -0,0 +1,184 @@
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from posts import follows, page_cache, renditions, search, timeline
+from posts.author_stats import change_stats
+from posts.feed_cache import bump_feed_version
+from posts.models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feeds(sender, **kwargs):
+    """Любое изменение постов, комментариев и групп сбрасывает ленты."""
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Post)
+def purge_post_pages(sender, instance, created, **kwargs):
+    """Новый пост сбрасывает первую страницу index, группу и профиль,
+    правка — все страницы лент и страницу поста.
+    """
+    if created:
+        page_cache.purge_new_post(instance)
+    else:
+        page_cache.purge_changed_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def purge_deleted_post_pages(sender, instance, **kwargs):
+    page_cache.purge_changed_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, **kwargs):
+    """Комментарий виден только на странице своего поста."""
+    if instance.post_id is not None:
+        page_cache.purge(page_cache.post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group_pages(sender, **kwargs):
+    """Название группы выводится в карточке поста на любой странице."""
+    page_cache.purge(page_cache.ALL)
+
+
+# Поля пользователя, которые выводятся в карточках постов.
+SHOWN_USER_FIELDS = frozenset({'username', 'first_name', 'last_name'})
+
+
+def shown_names(user):
+    """Загруженные значения выводимых полей пользователя."""
+    return {
+        field: user.__dict__[field]
+        for field in SHOWN_USER_FIELDS if field in user.__dict__
+    }
+
+
+@receiver(post_init, sender=User)
+def remember_user_names(sender, instance, **kwargs):
+    instance._loaded_names = shown_names(instance)
+
+
+@receiver(post_save, sender=User)
+def purge_user_pages(sender, instance, created, update_fields=None,
+                     **kwargs):
+    """Имя пользователя занято заново — сбрасывается его профиль; имя
+    автора поменялось — все ленты и страницы, где видны его посты.
+    Сохранение без смены имени, например правка пароля или почты
+    полным save(), страниц не сбрасывает.
+    """
+    if update_fields is not None and not SHOWN_USER_FIELDS & update_fields:
+        return
+    loaded = getattr(instance, '_loaded_names', {})
+    names = instance._loaded_names = shown_names(instance)
+    if created:
+        page_cache.purge(page_cache.profile_tag(instance.username))
+        return
+    # Поле, отложенное при загрузке, считается изменённым.
+    if all(field in loaded and loaded[field] == value
+           for field, value in names.items()):
+        return
+    bump_feed_version()
+    page_cache.purge(page_cache.ALL)
+
+
+@receiver(post_save, sender=Post)
+def track_saved_post(sender, instance, created, raw=False, **kwargs):
+    """Обновляет счётчики и ленты при создании поста и смене автора."""
+    if raw:
+        return
+    if created:
+        change_stats(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+    elif hasattr(instance, '_loaded_author_id'):
+        if instance._loaded_author_id != instance.author_id:
+            change_stats(instance._loaded_author_id, 'posts_count', -1)
+            change_stats(instance.author_id, 'posts_count', 1)
+            timeline.withdraw(instance)
+            timeline.fan_out(instance)
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Post)
+def track_deleted_post(sender, instance, **kwargs):
+    """Уменьшает счётчик автора удалённого поста."""
+    change_stats(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def track_follow(sender, instance, created, raw=False, **kwargs):
+    """Подписки, сохранённые моделью (например, в админке), обновляют
+    те же производные данные, что и posts.follows.
+    """
+    if created and not raw:
+        follows.followed(instance.user, instance.author)
+    else:
+        follows.invalidate(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def track_unfollow(sender, instance, **kwargs):
+    follows.unfollowed(instance.user, instance.author)
+
+
+def image_changed(post):
+    if not post.image:
+        return False
+    if not post.image._committed:
+        return True
+    return post.image.name != getattr(post, '_loaded_image', '')
+
+
+@receiver(pre_save, sender=Post)
+def reset_feed_image(sender, instance, raw=False, **kwargs):
+    """Новая картинка поста делает старую копию для ленты неактуальной."""
+    instance._image_changed = not raw and image_changed(instance)
+    if instance._image_changed or not instance.image:
+        instance.feed_image_url = ''
+
+
+@receiver(post_save, sender=Post)
+def render_feed_image(sender, instance, raw=False, **kwargs):
+    """Заказывает копию новой картинки поста для лент."""
+    if raw or not instance._image_changed:
+        return
+    instance._loaded_image = instance.image.name
+    renditions.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    """Обновляет пост в поисковом индексе."""
+    search.index_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """Убирает из индекса пост и его комментарии до того, как
+    комментарии потеряют ссылку на пост.
+    """
+    search.unindex_post(
+        instance.pk,
+        instance.comments.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    """Обновляет комментарий в поисковом индексе."""
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    """Убирает комментарий из поискового индекса."""
+    search.unindex_comment(instance.pk)
@@ -0,0 +1,131 @@
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import search
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def changelist(model):
+    return reverse(f'admin:posts_{model._meta.model_name}_changelist')
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='boss', email='boss@example.com', password='pass')
+        cls.author = User.objects.create_user(username='penman')
+        cls.group = Group.objects.create(
+            title='Группа', slug='admin-group', description='Описание')
+        cls.hedgehog = Post.objects.create(
+            author=cls.author, group=cls.group, text='Ёжик в тумане')
+        Comment.objects.create(
+            post=cls.hedgehog, author=cls.author, text='Где лошадка?')
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for i in range(count):
+            user = User.objects.create_user(username=f'extra{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'extra-{i}', description='')
+            post = Post.objects.create(
+                author=user, group=group, text=f'Пост {i}')
+            Comment.objects.create(post=post, author=user, text='Ответ')
+            Follow.objects.create(user=user, author=self.author)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Списки админки загружают связанные строки вместе"""
+        models = (Post, Comment, Follow)
+        before = {model: self.count_queries(changelist(model))
+                  for model in models}
+        self.add_rows(5)
+        for model in models:
+            with self.subTest(model=model.__name__):
+                self.assertEqual(
+                    self.count_queries(changelist(model)), before[model])
+
+    def test_text_search(self):
+        if not search.available():
+            self.skipTest('Нет полнотекстового индекса')
+        response = self.client.get(changelist(Post), {'q': 'ежик'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.hedgehog])
+        response = self.client.get(changelist(Comment), {'q': 'лошадка'})
+        self.assertEqual(
+            [comment.text for comment in response.context['cl'].result_list],
+            ['Где лошадка?'])
+        response = self.client.get(changelist(Post), {'q': 'лошадка'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_text_search_by_prefix(self):
+        """Поиск списка и autocomplete находят слово по его началу"""
+        if not search.available():
+            self.skipTest('Нет полнотекстового индекса')
+        response = self.client.get(changelist(Post), {'q': 'ёжи тум'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.hedgehog])
+        response = self.client.get(
+            reverse('admin:posts_post_autocomplete'), {'term': 'Ёж'})
+        self.assertEqual(
+            [result['id'] for result in response.json()['results']],
+            [str(self.hedgehog.pk)])
+        response = self.client.get(
+            reverse('admin:posts_post_autocomplete'), {'term': 'тумба'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_follow_search_by_username(self):
+        response = self.client.get(changelist(Follow), {'q': 'penman'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(changelist(Follow), {'q': 'penm'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_date_hierarchy_matches_distinct(self):
+        """Пробы по индексу находят те же периоды, что и DISTINCT"""
+        Post.objects.filter(pk=self.hedgehog.pk).update(
+            pub_date=timezone.make_aware(datetime(2019, 5, 1)))
+        Post.objects.create(author=self.author, text='Свежий пост')
+        for method in ('dates', 'datetimes'):
+            for kind in ('year', 'month', 'day'):
+                with self.subTest(method=method, kind=kind):
+                    self.assertEqual(
+                        getattr(Post.date_probes, method)('pub_date', kind),
+                        list(getattr(Post.objects, method)(
+                            'pub_date', kind)))
+        self.assertIsInstance(Post.objects.dates('pub_date', 'year'), QuerySet)
+        response = self.client.get(changelist(Post))
+        self.assertContains(response, '?pub_date__year=2019')
+        response = self.client.get(
+            changelist(Post), {'pub_date__year': 2019})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.hedgehog])
+
+    @override_settings(ADMIN_COUNT_LIMIT=2)
+    def test_counts_are_bounded(self):
+        self.add_rows(3)
+        response = self.client.get(changelist(Post))
+        self.assertEqual(
+            response.context['cl'].result_count,
+            Post.objects.order_by('-pk').values_list('pk', flat=True)[0])
+        response = self.client.get(
+            changelist(Post), {'author__id__exact': self.author.pk})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response = self.client.get(changelist(Comment), {'q': 'Ответ'})
+        self.assertEqual(response.context['cl'].result_count, 2)
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from posts.models import Post
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from posts.models import Comment, Follow, Group, Post
 from django.urls import reverse
 from django.core.cache import cache
 
@@ -18,11 +20,14 @@ class TestCache(TestCase):
             author=cls.user,
         )
 
-    def test_index_cache(self):
+    def setUp(self):
         cache.clear()
+
+    def test_index_cache(self):
+        """Лента index отдаётся из кэша, пока посты не менялись"""
         response = self.client.get(reverse('posts:index'))
-        self.assertIn(self.post, response.context['posts'])
-        TestCache.post.delete()
+        self.assertIn(self.post, response.context['page_obj'])
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response = self.client.get(reverse('posts:index'))
         self.assertIn(
             TestCache.post.text, response.getvalue().decode('UTF8')
@@ -32,3 +37,218 @@ class TestCache(TestCase):
         self.assertNotIn(
             TestCache.post.text, response.getvalue().decode('UTF8')
         )
+
+    def test_index_cache_invalidated_on_delete(self):
+        """Удалённый пост сразу пропадает из закэшированной ленты"""
+        post = Post.objects.create(text='Пост на удаление', author=self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn(post.text, response.getvalue().decode('UTF8'))
+        post.delete()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(post.text, response.getvalue().decode('UTF8'))
+
+    def test_index_fragment_hit_skips_feed_query(self):
+        """Из кэша фрагмента лента отдаётся без запроса постов"""
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'posts_post' in query['sql']
+        ])
+
+    def test_index_cache_invalidated_on_author_rename(self):
+        """Новое имя автора сразу видно в закэшированной ленте"""
+        client = Client()
+        client.force_login(self.user)
+        for viewer in (self.client, client):
+            viewer.get(reverse('posts:index'))
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Переименованный'
+        author.save()
+        for viewer in (self.client, client):
+            with self.subTest(viewer=viewer):
+                self.assertContains(
+                    viewer.get(reverse('posts:index')), 'Переименованный')
+
+    def test_index_first_page_by_number_invalidated(self):
+        """Новый пост сразу виден и на /?page=1"""
+        url = reverse('posts:index') + '?page=1'
+        self.client.get(url)
+        post = Post.objects.create(text='Свежий пост', author=self.user)
+        self.assertContains(self.client.get(url), post.text)
+
+    def test_index_cache_kept_on_user_save_without_rename(self):
+        """Сохранение пользователя без смены имени не сбрасывает ленты"""
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        author = User.objects.get(pk=self.user.pk)
+        author.email = 'author@example.com'
+        author.save()
+        self.assertContains(
+            self.client.get(reverse('posts:index')), self.post.text)
+
+    def test_index_cache_varies_by_page(self):
+        """Каждая страница ленты кэшируется отдельно"""
+        for i in range(10):
+            Post.objects.create(text=f'Пост ленты {i}', author=self.user)
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertIn(
+            TestCache.post.text, response.getvalue().decode('UTF8')
+        )
+
+
+class TestConditionalGet(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def public_urls(self):
+        return [
+            reverse('posts:index'),
+            reverse('posts:slug', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+
+    def test_not_modified_without_queries(self):
+        """Повторный анонимный запрос получает 304 без запросов к базе"""
+        for url in self.public_urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertIn('must-revalidate', response['Cache-Control'])
+
+    def test_etag_depends_on_session(self):
+        """Страница авторизованного зрителя приватна и не совпадает
+        с анонимной
+        """
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        anonymous = self.client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        response = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_on_updates(self):
+        """Новый комментарий и подписка дают полный ответ вместо 304"""
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        profile = reverse('posts:profile', args=[self.user.username])
+        etags = {
+            url: self.client.get(url)['ETag'] for url in (detail, profile)
+        }
+        Comment.objects.create(post=self.post, author=self.reader, text='Ок')
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etags[detail])
+        self.assertEqual(response.status_code, 200)
+        etags[profile] = self.client.get(profile)['ETag']
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.client.get(
+            profile, HTTP_IF_NONE_MATCH=etags[profile])
+        self.assertEqual(response.status_code, 200)
+
+
+class TestPageCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def urls(self):
+        return {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:slug', args=[self.group.slug]),
+            'other_group': reverse(
+                'posts:slug', args=[self.other_group.slug]),
+            'profile': reverse('posts:profile', args=[self.user.username]),
+            'post_detail': reverse('posts:post_detail', args=[self.post.pk]),
+        }
+
+    def warm(self):
+        for url in self.urls().values():
+            self.client.get(url)
+
+    def cached(self):
+        """Страницы, которые сейчас отдаются без запросов к базе."""
+        cached = set()
+        for name, url in self.urls().items():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            if not queries.captured_queries:
+                cached.add(name)
+        return cached
+
+    def test_anonymous_hit_skips_database(self):
+        """Повторный анонимный запрос отдаётся целиком из кэша"""
+        self.warm()
+        self.assertEqual(self.cached(), set(self.urls()))
+
+    def test_authenticated_bypass(self):
+        """Авторизованные запросы мимо кэша страниц"""
+        self.warm()
+        url = self.urls()['index']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertTrue(queries.captured_queries)
+        self.assertIsNotNone(response.context)
+
+    def test_new_post_purge(self):
+        """Новый пост сбрасывает index, свою группу и профиль автора"""
+        self.warm()
+        Post.objects.create(text='Новый', author=self.user, group=self.group)
+        self.assertEqual(self.cached(), {'other_group', 'post_detail'})
+
+    def test_comment_purge(self):
+        """Комментарий сбрасывает только страницу своего поста"""
+        self.warm()
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        self.assertEqual(
+            self.cached(), set(self.urls()) - {'post_detail'})
+
+    def test_not_modified_from_cache(self):
+        """Страница из кэша отвечает 304 на совпавший ETag"""
+        url = self.urls()['index']
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -1,11 +1,16 @@
 from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from posts.models import Post, Group, Comment
+from posts.uploads import OversizedUpload
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 import tempfile
+from io import BytesIO
 from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
 import shutil
+import warnings
 
 
 User = get_user_model()
@@ -90,6 +95,133 @@ class PostCreateFormTests(TestCase):
             text=form_data['text'], group=form_data['group']).exists())
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RENDITION_WORKERS=0)
+class FeedImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='photographer')
+        cls.authorized_client = Client()
+
+    def setUp(self):
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, name='photo.png', size=(200, 100)):
+        buffer = BytesIO()
+        Image.new('RGB', size, color=(200, 0, 0)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+    def test_feed_image_rendered_on_save(self):
+        """При сохранении формы строится копия картинки 960x339"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото', 'image': self.upload()},
+        )
+        post = Post.objects.get(text='Пост с фото')
+        self.assertTrue(post.feed_image_url)
+        name = post.feed_image_url[len(settings.MEDIA_URL):]
+        with default_storage.open(name) as rendition:
+            self.assertEqual(Image.open(rendition).size, (960, 339))
+
+    def test_feed_image_kept_when_image_unchanged(self):
+        """Правка текста не сбрасывает готовую копию картинки"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Исходный текст', 'image': self.upload()},
+        )
+        post = Post.objects.get(text='Исходный текст')
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            data={'text': 'Новый текст'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertTrue(post.feed_image_url)
+
+    def test_feed_shows_rendition(self):
+        """Лента выводит готовую копию картинки"""
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload())
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.feed_image_url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RENDITION_WORKERS=0)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='uploader')
+        cls.authorized_client = Client()
+
+    def setUp(self):
+        self.authorized_client.force_login(self.user)
+
+    def jpeg_with_exif(self, size):
+        image = Image.effect_noise(size, 64).convert('RGB')
+        exif = Image.Exif()
+        exif[0x010f] = 'Камера'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes(), quality=95)
+        return SimpleUploadedFile(
+            'camera.jpg', buffer.getvalue(), 'image/jpeg')
+
+    def create(self, text, upload):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': text, 'image': upload},
+        )
+
+    @override_settings(POST_IMAGE_STORED_SIDE=500)
+    def test_upload_downscaled_and_stripped(self):
+        """Большая картинка уменьшается и теряет EXIF"""
+        self.create('Фото с камеры', self.jpeg_with_exif((1500, 1000)))
+        post = Post.objects.get(text='Фото с камеры')
+        with default_storage.open(post.image.name) as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (500, 333))
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=1000)
+    def test_upload_too_large_side(self):
+        """Картинка со стороной больше лимита отклоняется"""
+        response = self.create('Огромное фото', self.jpeg_with_exif(
+            (1500, 100)))
+        self.assertFalse(Post.objects.filter(text='Огромное фото').exists())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Сторона картинки больше 1000 пикселей.')
+
+    def test_upload_decompression_bomb(self):
+        """Маленький файл с огромным числом пикселей отклоняется по
+        заголовку, до декодирования.
+        """
+        buffer = BytesIO()
+        Image.new('1', (9000, 9000)).save(buffer, 'PNG')
+        upload = SimpleUploadedFile(
+            'bomb.png', buffer.getvalue(), 'image/png')
+        self.assertLess(upload.size, settings.POST_IMAGE_MAX_BYTES)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            response = self.create('Бомба', upload)
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
+        self.assertFormError(
+            response, 'form', 'image', 'В картинке больше 50 млн пикселей.')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_upload_too_large_file(self):
+        """Файл больше лимита отклоняется, и его содержимое после
+        лимита не сохраняется.
+        """
+        upload = self.jpeg_with_exif((300, 300))
+        response = self.create('Тяжёлое фото', upload)
+        self.assertFalse(Post.objects.filter(text='Тяжёлое фото').exists())
+        self.assertFormError(response, 'form', 'image', 'Файл больше 0 МБ.')
+        oversized = response.context['form'].oversized
+        self.assertIsInstance(oversized, OversizedUpload)
+        self.assertEqual(oversized.size, upload.size)
+
+
 class TestCommens(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,222 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts import search
+from posts.models import (
+    AuthorStats, Comment, Follow, Group, Post, TimelineEntry
+)
+
+User = get_user_model()
+
+
+class ImportCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='local_author')
+        cls.reader = User.objects.create_user(username='local_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='local', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.create(text='Старый пост', author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def write_jsonl(self, records):
+        return self.write('data.jsonl', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records))
+
+    def test_import_jsonl(self):
+        """Посты, комментарии и подписки импортируются с датами,
+        счётчиками, лентами и поиском
+        """
+        path = self.write_jsonl([
+            {'type': 'post', 'id': 1, 'author': 'local_author',
+             'group': 'local', 'text': 'Перенесённый пост о ёжике',
+             'pub_date': '2015-03-01T10:00:00'},
+            {'type': 'post', 'id': 2, 'author': 'newcomer',
+             'group': 'imported', 'text': 'Пост нового автора'},
+            {'type': 'comment', 'post': 1, 'author': 'newcomer',
+             'text': 'Комментарий к перенесённому',
+             'created': '2015-03-02T10:00:00+00:00'},
+            {'type': 'follow', 'user': 'local_reader', 'author': 'newcomer'},
+            {'type': 'follow', 'user': 'local_reader', 'author': 'newcomer'},
+        ])
+        out = StringIO()
+        call_command('import_yatube', path, '--batch-size', '2', stdout=out)
+        self.assertIn(
+            'постов: 2, комментариев: 1, подписок: 1', out.getvalue())
+        imported = Post.objects.get(text='Перенесённый пост о ёжике')
+        self.assertEqual(imported.author, self.author)
+        self.assertEqual(imported.group, self.group)
+        self.assertEqual(
+            imported.pub_date,
+            timezone.make_aware(datetime(2015, 3, 1, 10)))
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(
+            Post.objects.get(author=newcomer).group.slug, 'imported')
+        comment = Comment.objects.get(text='Комментарий к перенесённому')
+        self.assertEqual(comment.post, imported)
+        self.assertEqual(comment.created.year, 2015)
+        self.assertEqual(
+            AuthorStats.objects.get(author=newcomer).followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.author).posts_count, 2)
+        call_command('rebuild_author_stats', '--check', stdout=StringIO())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.reader).values_list('post__text', flat=True)),
+            {'Старый пост', 'Перенесённый пост о ёжике',
+             'Пост нового автора'}
+        )
+        if search.available():
+            posts, _ = search.search('ежике')
+            self.assertEqual(posts, [imported])
+            posts, _ = search.search('перенесённому')
+            self.assertEqual(posts, [imported])
+        post = Post.objects.create(text='После импорта', author=self.author)
+        self.assertGreater(post.pk, imported.pk)
+
+    def test_import_csv(self):
+        path = self.write(
+            'posts.csv',
+            'id,author,group,text\n'
+            '7,local_author,,Пост из CSV\n'
+            '8,local_author,local,"Второй, с запятой"\n'
+        )
+        call_command(
+            'import_yatube', path, '--type', 'post', stdout=StringIO())
+        self.assertEqual(
+            set(Post.objects.filter(group=None, text__contains='CSV')
+                .values_list('text', flat=True)),
+            {'Пост из CSV'}
+        )
+        self.assertTrue(
+            Post.objects.filter(text='Второй, с запятой', group=self.group)
+            .exists())
+
+    def test_invalid_record(self):
+        """Ошибка называет строку, уже записанные пачки остаются"""
+        path = self.write_jsonl([
+            {'type': 'post', 'id': 1, 'author': 'local_author',
+             'text': 'Первая пачка'},
+            {'type': 'post', 'id': 2, 'author': 'local_author'},
+        ])
+        message = 'Строка 2: нет полей text'
+        with self.assertRaisesMessage(CommandError, message):
+            call_command(
+                'import_yatube', path, '--batch-size', '1',
+                stdout=StringIO())
+        post = Post.objects.get(text='Первая пачка')
+        # Производные данные досчитаны и для оборванного импорта.
+        call_command('rebuild_author_stats', '--check', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertGreater(Post.objects.create(
+            text='Новый пост', author=self.author).pk, post.pk)
+
+    def test_comment_before_post_across_batches(self):
+        """Комментарий ждёт свой пост из следующей пачки, а повторный
+        импорт ничего не дублирует.
+        """
+        path = self.write_jsonl([
+            {'type': 'comment', 'post': 5, 'author': 'local_reader',
+             'text': 'Раньше поста'},
+            {'type': 'follow', 'user': 'local_reader', 'author': 'writer'},
+            {'type': 'post', 'id': 5, 'author': 'writer',
+             'text': 'Пост после комментария'},
+        ])
+        call_command(
+            'import_yatube', path, '--batch-size', '1', stdout=StringIO())
+        post = Post.objects.get(text='Пост после комментария')
+        self.assertEqual(
+            list(post.comments.values_list('text', flat=True)),
+            ['Раньше поста'])
+        counts = (Post.objects.count(), Comment.objects.count(),
+                  Follow.objects.count())
+        out = StringIO()
+        call_command('import_yatube', path, '--batch-size', '1', stdout=out)
+        self.assertIn(
+            'постов: 0, комментариев: 0, подписок: 0', out.getvalue())
+        self.assertEqual(
+            (Post.objects.count(), Comment.objects.count(),
+             Follow.objects.count()),
+            counts)
+
+    def test_waiting_comments_find_their_posts(self):
+        """Отложенные комментарии достаются к своим постам, в какой бы
+        пачке те ни пришли.
+        """
+        records = [
+            {'type': 'comment', 'post': source_id, 'author': 'local_reader',
+             'text': f'К посту {source_id}'}
+            for source_id in (12, 11, 12, 10)
+        ]
+        records += [
+            {'type': 'post', 'id': source_id, 'author': 'local_author',
+             'text': f'Пост {source_id}'}
+            for source_id in (10, 11, 12)
+        ]
+        call_command(
+            'import_yatube', self.write_jsonl(records), '--batch-size', '2',
+            stdout=StringIO())
+        for source_id, total in ((10, 1), (11, 1), (12, 2)):
+            post = Post.objects.get(text=f'Пост {source_id}')
+            self.assertEqual(
+                list(post.comments.values_list('text', flat=True)),
+                [f'К посту {source_id}'] * total)
+
+    def test_evicted_post_ids_are_looked_up(self):
+        """Выброшенные из памяти соответствия id постов снова читаются из
+        ImportedPost.
+        """
+        path = self.write_jsonl([
+            {'type': 'post', 'id': 1, 'author': 'local_author',
+             'text': 'Первый пост'},
+            {'type': 'post', 'id': 2, 'author': 'local_author',
+             'text': 'Второй пост'},
+            {'type': 'post', 'id': 3, 'author': 'local_author',
+             'text': 'Третий пост'},
+            {'type': 'comment', 'post': 1, 'author': 'local_reader',
+             'text': 'К первому'},
+            {'type': 'post', 'id': 1, 'author': 'local_author',
+             'text': 'Первый пост'},
+        ])
+        with mock.patch(
+                'posts.management.commands.import_yatube.CACHED_POST_IDS', 1):
+            call_command(
+                'import_yatube', path, '--batch-size', '1',
+                stdout=StringIO())
+        post = Post.objects.get(text='Первый пост')
+        self.assertEqual(
+            list(post.comments.values_list('text', flat=True)),
+            ['К первому'])
+
+    def test_comment_without_post(self):
+        path = self.write_jsonl([
+            {'type': 'post', 'id': 1, 'author': 'local_author',
+             'text': 'Пост'},
+            {'type': 'comment', 'post': 2, 'author': 'local_author',
+             'text': 'Сирота'},
+        ])
+        with self.assertRaisesMessage(CommandError, 'Строки 2:'):
+            call_command('import_yatube', path, stdout=StringIO())
+        self.assertFalse(Comment.objects.filter(text='Сирота').exists())
@@ -1,6 +1,9 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase
-from ..models import Comment, Follow, Group, Post
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 
 User = get_user_model()
@@ -73,3 +76,37 @@ class FollowModelTest(TestCase):
         follow = FollowModelTest.follow
         expected_follow_title = f'{self.user} подписан на {self.author}'
         self.assertEqual(str(follow), expected_follow_title)
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.another = User.objects.create_user(username='another')
+
+    def posts_count(self, user):
+        return AuthorStats.objects.get(author=user).posts_count
+
+    def test_counter_follows_create_delete_and_reassign(self):
+        """Счётчик постов меняется при создании, удалении и смене автора."""
+        post = Post.objects.create(author=self.user, text='Пост 1')
+        Post.objects.create(author=self.user, text='Пост 2')
+        self.assertEqual(self.posts_count(self.user), 2)
+        post = Post.objects.get(pk=post.pk)
+        post.author = self.another
+        post.save()
+        self.assertEqual(self.posts_count(self.user), 1)
+        self.assertEqual(self.posts_count(self.another), 1)
+        post.delete()
+        self.assertEqual(self.posts_count(self.another), 0)
+
+    def test_rebuild_author_stats(self):
+        """Команда находит и исправляет разошедшиеся счётчики."""
+        Post.objects.create(author=self.user, text='Пост')
+        AuthorStats.objects.filter(author=self.user).update(posts_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_author_stats', '--check', stdout=StringIO())
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.posts_count(self.user), 1)
+        call_command('rebuild_author_stats', '--check', stdout=StringIO())
@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import urls
+from posts.models import Comment, Follow, Group, Post
+
+from .utils import QueryBudgetMixin
+
+
+User = get_user_model()
+
+# Бюджет не зависит от числа постов и комментариев на странице.
+QUERY_BUDGETS = {
+    'index': 3,
+    'slug': 5,
+    'profile': 5,
+    'post_detail': 4,
+    'post_create': 3,
+    'post_edit': 4,
+    'add_comment': 5,
+    'post_comments': 3,
+    'follow_index': 4,
+    'search': 4,
+    'profile_follow': 10,
+    'profile_unfollow': 7,
+    'group_follow': 12,
+}
+
+
+class TestQueryBudget(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = []
+        for i in range(12):
+            author = User.objects.create_user(
+                username=f'author{i}', first_name='Имя', last_name='Автор')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'slug-{i}',
+                description='Описание',
+            )
+            Post.objects.create(author=author, group=group, text=f'Пост {i}')
+            Follow.objects.create(user=cls.user, author=author)
+            cls.authors.append(author)
+        cls.post = Post.objects.filter(author=cls.authors[0]).first()
+        for author in cls.authors:
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def requests(self):
+        post_id = self.post.pk
+        author = self.authors[0].username
+        return {
+            'index': ('get', reverse('posts:index'), {}),
+            'slug': ('get', reverse('posts:slug', args=['slug-0']), {}),
+            'profile': ('get', reverse('posts:profile', args=[author]), {}),
+            'post_detail': (
+                'get', reverse('posts:post_detail', args=[post_id]), {}),
+            'post_create': ('get', reverse('posts:post_create'), {}),
+            'post_edit': (
+                'get', reverse('posts:post_edit', args=[post_id]), {}),
+            'add_comment': (
+                'post', reverse('posts:add_comment', args=[post_id]),
+                {'text': 'Новый комментарий'}),
+            'post_comments': (
+                'get', reverse('posts:post_comments', args=[post_id]), {}),
+            'follow_index': ('get', reverse('posts:follow_index'), {}),
+            'search': ('get', reverse('posts:search'), {'q': 'Пост'}),
+            'profile_unfollow': (
+                'get', reverse('posts:profile_unfollow', args=[author]), {}),
+            'profile_follow': (
+                'get', reverse('posts:profile_follow', args=[author]), {}),
+            'group_follow': (
+                'post', reverse('posts:group_follow', args=['slug-1']), {}),
+        }
+
+    def test_every_url_has_budget(self):
+        """Для каждого адреса из posts/urls.py задан бюджет запросов"""
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(QUERY_BUDGETS))
+        self.assertEqual(names, set(self.requests()))
+
+    def test_query_budgets(self):
+        """Страницы укладываются в бюджет запросов без N+1"""
+        for name, (method, url, data) in self.requests().items():
+            with self.subTest(name=name):
+                with self.assertMaxQueries(QUERY_BUDGETS[name]):
+                    getattr(self.authorized_client, method)(url, data)
@@ -0,0 +1,138 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+# Форма поста выводит все группы в выпадающем списке, а счётчики
+# админки проходят подзапрос, ограниченный ADMIN_COUNT_LIMIT.
+ALLOWED_FULL_SCANS = {'posts_group', 'subquery'}
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class TestQueryPlans(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(15):
+            Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Тестовый текст{i}',
+            )
+        cls.post = Post.objects.first()
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url, client=None, sorted_matches=False):
+        """sorted_matches разрешает сортировку строк, найденных по
+        индексам, когда порядок списка не совпадает ни с одним из них.
+        """
+        client = client or self.authorized_client
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for step in self.explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    if sorted_matches and step.endswith('FOR ORDER BY'):
+                        continue
+                    self.assertNotIn('TEMP B-TREE', step)
+                    scan = FULL_SCAN.match(step)
+                    if scan:
+                        self.assertIn(scan.group(1), ALLOWED_FULL_SCANS)
+
+    def feed_urls(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:slug', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        ]
+        for url in list(urls):
+            response = self.authorized_client.get(url)
+            urls.append(
+                url + '?cursor=' + response.context['page_obj'].next_cursor)
+            urls.append(url + '?page=2')
+        return urls
+
+    def test_feed_query_plans(self):
+        """Запросы лент идут по индексам и без сортировки во временном
+        B-дереве.
+        """
+        for url in self.feed_urls():
+            self.assert_indexed(url)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_timeline_query_plans(self):
+        """Подмешивание постов популярных авторов идёт по индексам."""
+        self.assert_indexed(reverse('posts:follow_index'))
+
+    @override_settings(COMMENT_PAGE_NUM=1)
+    def test_post_pages_query_plans(self):
+        """Страницы поста, комментариев, создания и правки используют
+        индексы.
+        """
+        comments_url = reverse('posts:post_comments', args=[self.post.pk])
+        cursor = self.client.get(comments_url).context['comments'].next_cursor
+        for url in (
+            reverse('posts:post_detail', args=[self.post.pk]),
+            comments_url,
+            comments_url + '?cursor=' + cursor,
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', args=[self.post.pk]),
+        ):
+            self.assert_indexed(url)
+
+    def test_admin_changelist_query_plans(self):
+        """Списки админки, их счётчики и date_hierarchy используют
+        индексы.
+        """
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        year = self.post.pub_date.year
+        for model, date_field in (
+            (Post, 'pub_date'), (Comment, 'created'), (Follow, None)
+        ):
+            url = reverse(
+                f'admin:posts_{model._meta.model_name}_changelist')
+            self.assert_indexed(url, client)
+            if date_field:
+                self.assert_indexed(
+                    f'{url}?{date_field}__year={year}', client)
+        # Подписки и подписчики пользователя берутся по двум индексам
+        # и сортируются: их не больше, чем связей у одного пользователя.
+        self.assert_indexed(
+            reverse('admin:posts_follow_changelist') + '?q=author', client,
+            sorted_matches=True)
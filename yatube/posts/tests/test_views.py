@@ -1,11 +1,24 @@
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
-from posts.models import Group, Post, Comment, Follow
+from django.test import TestCase, Client, override_settings
+from posts.models import (
+    AuthorStats, Comment, Follow, Group, Post, TimelineEntry
+)
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
 
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts import follow_graph, follows, page_cache, search
+from posts.paginators import NEXT, PREVIOUS, encode_cursor
+
 
 User = get_user_model()
 
@@ -94,7 +107,7 @@ class StaticURLTests(TestCase):
     def test_index_page_show_correct_context(self):
         """Шаблон index сформирован с правильным контекстом."""
         response = self.guest_client.get(reverse('posts:index'))
-        post = response.context['posts'][0]
+        post = response.context['page_obj'][0]
         self.assertTrue(self.correct_context(post))
 
     def test_group_list_page_show_correct_context(self):
@@ -103,10 +116,10 @@ class StaticURLTests(TestCase):
         expected_group = Group.objects.get(slug=group_slug)
         response = self.guest_client.get(
             reverse('posts:slug', args=[group_slug]))
-        posts = response.context['posts']
+        posts = response.context['page_obj']
         for post in posts:
             self.assertEqual(post.group, expected_group)
-        post0 = response.context['posts'][0]
+        post0 = response.context['page_obj'][0]
         self.assertTrue(self.correct_context(post0))
 
     def test_profile_page_show_correct_context(self):
@@ -160,7 +173,7 @@ class StaticURLTests(TestCase):
         """
         response = self.guest_client.get(
             reverse('posts:index'))
-        posts = response.context['posts']
+        posts = response.context['page_obj']
         post = self.post
         self.assertIn(post, posts)
 
@@ -170,7 +183,7 @@ class StaticURLTests(TestCase):
         """
         response = self.guest_client.get(
             reverse('posts:slug', args=['test-slug0']))
-        posts = response.context['posts']
+        posts = response.context['page_obj']
         post = (self.post)
         self.assertIn(post, posts)
 
@@ -201,6 +214,60 @@ class StaticURLTests(TestCase):
         self.assertIn(self.comment, comments)
 
 
+@override_settings(COMMENT_PAGE_NUM=3)
+class TestCommentPages(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(author=cls.user, text='Вирусный пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(7)
+        ]
+
+    def test_first_page_is_bounded(self):
+        """На странице поста только первая порция комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:3])
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', args=[self.post.pk])
+            + '?cursor=' + comments.next_cursor
+        )
+
+    def test_fragment_continues_from_cursor(self):
+        """Фрагмент отдаёт следующие порции до последней"""
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        loaded = []
+        cursor = ''
+        while cursor is not None:
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateUsed(
+                response, 'posts/includes/comment_list.html')
+            self.assertTemplateNotUsed(response, 'base.html')
+            loaded += response.context['comments']
+            cursor = response.context['comments'].next_cursor
+        self.assertEqual(loaded, self.comments)
+
+    def test_fragment_json(self):
+        """Фрагмент отдаёт порцию комментариев в JSON"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk]),
+            {'format': 'json'}
+        )
+        data = response.json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.pk for comment in self.comments[:3]]
+        )
+        self.assertEqual(data['comments'][0]['author'], 'commentator')
+        self.assertIsNotNone(data['next_cursor'])
+
+
 class TestPaginator(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -222,6 +289,7 @@ class TestPaginator(TestCase):
             cls.posts.append(post)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='Dagik')
         self.authorized_client = Client()
@@ -252,6 +320,48 @@ class TestPaginator(TestCase):
             reverse('posts:profile', args=['test_user']) + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pagination(self):
+        """Курсорная паджинация отдаёт страницы без пропусков и повторов"""
+        url = reverse('posts:slug', args=['test-slug0'])
+        response = self.client.get(url)
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        response = self.client.get(
+            url, {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        shown = list(first_page) + list(second_page)
+        self.assertEqual(shown, sorted(
+            self.posts, key=lambda post: (post.pub_date, post.pk),
+            reverse=True))
+        response = self.client.get(
+            url, {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(first_page))
+
+    def test_cursor_past_either_end(self):
+        """Курсор за краем ленты даёт пустую страницу без ссылок"""
+        url = reverse('posts:slug', args=['test-slug0'])
+        newest = max(self.posts, key=lambda post: (post.pub_date, post.pk))
+        oldest = min(self.posts, key=lambda post: (post.pub_date, post.pk))
+        for direction, post in ((NEXT, oldest), (PREVIOUS, newest)):
+            with self.subTest(direction=direction):
+                response = self.client.get(
+                    url, {'cursor': encode_cursor(direction, post)})
+                page = response.context['page_obj']
+                self.assertEqual(len(page), 0)
+                self.assertFalse(page.has_next())
+                self.assertFalse(page.has_previous())
+                self.assertNotContains(response, 'cursor=None')
+
+    def test_broken_cursor(self):
+        """Битый курсор открывает первую страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
 
 class TestPaginatorIndex(TestCase):
     @classmethod
@@ -278,6 +388,7 @@ class TestPaginatorIndex(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -285,11 +396,22 @@ class TestPaginatorIndex(TestCase):
     def test_follow_index_paginator(self):
         """Паджинация страницы follow_index работает верно"""
         response = self.authorized_client.get(reverse('posts:follow_index'))
-        self.assertEqual(len(response.context['page_obj']), 10)
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
         response = self.authorized_client.get(
-            reverse('posts:follow_index') + '?page=2')
+            reverse('posts:follow_index') + '?cursor=' + page_obj.next_cursor)
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_follow_index_ignores_page_numbers(self):
+        """Лента подписок только курсорная: ?page=N открывает первую
+        страницу.
+        """
+        response = self.authorized_client.get(
+            reverse('posts:follow_index') + '?page=2')
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.paginator.is_cursor)
+        self.assertEqual(len(page_obj), 10)
+
 
 class TestFollow(TestCase):
     @classmethod
@@ -349,3 +471,314 @@ class TestFollow(TestCase):
         )
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'])
+
+
+class TestTimeline(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    @override_settings(TIMELINE_MAX_ENTRIES=3)
+    def test_timeline_is_capped(self):
+        """Лента подписчика хранит не больше TIMELINE_MAX_ENTRIES записей"""
+        Follow.objects.create(user=self.user, author=self.author)
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(len(self.feed()), 3)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении"""
+        another = User.objects.create_user(username='another')
+        Follow.objects.create(user=another, author=self.star)
+        Follow.objects.create(user=self.user, author=self.star)
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Обычный')
+        star_post = Post.objects.create(author=self.star, text='Звёздный')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=star_post).exists())
+        self.assertEqual(self.feed(), [star_post, post])
+
+    @override_settings(
+        TIMELINE_FANOUT_LIMIT=2, TIMELINE_DEMOTE_LIMIT=2, TIMELINE_WORKERS=0)
+    def test_former_celebrity_posts_backfilled(self):
+        """Автор перестаёт быть популярным, только когда подписчиков
+        меньше TIMELINE_DEMOTE_LIMIT, и тогда его посты раскладываются
+        по лентам оставшихся подписчиков.
+        """
+        another = User.objects.create_user(username='another')
+        third = User.objects.create_user(username='third')
+        for user in (another, third, self.user):
+            Follow.objects.create(user=user, author=self.star)
+        star_post = Post.objects.create(author=self.star, text='Звёздный')
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=star_post).exists())
+        Follow.objects.get(user=another, author=self.star).delete()
+        self.assertTrue(AuthorStats.objects.get(author=self.star).celebrity)
+        self.assertFalse(
+            TimelineEntry.objects.filter(post=star_post).exists())
+        self.assertEqual(self.feed(), [star_post])
+        Follow.objects.get(user=third, author=self.star).delete()
+        self.assertFalse(AuthorStats.objects.get(author=self.star).celebrity)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=star_post).exists())
+        self.assertEqual(self.feed(), [star_post])
+
+    def test_unfollow_clears_timeline(self):
+        """После отписки посты автора пропадают из ленты"""
+        Post.objects.create(author=self.author, text='Пост до подписки')
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertEqual(len(self.feed()), 1)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertEqual(self.feed(), [])
+
+
+class TestFollowGraph(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='fan')
+        cls.author = User.objects.create_user(username='idol')
+        cls.other = User.objects.create_user(username='stranger')
+        cls.group = Group.objects.create(
+            title='Группа', slug='graph', description='Описание')
+        Follow.objects.create(user=cls.other, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_profile_following_is_per_viewer(self):
+        """Кнопка подписки зависит от подписок зрителя, а не всех"""
+        url = reverse('posts:profile', args=[self.author.username])
+        response = self.authorized_client.get(url)
+        self.assertFalse(response.context['following'])
+        self.assertEqual(response.context['followers_count'], 1)
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        response = self.authorized_client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertEqual(response.context['followers_count'], 2)
+        response = self.authorized_client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertEqual(response.context['following_count'], 1)
+
+    def test_batch_lookup_is_updated_in_place(self):
+        """Подписка и отписка правят закэшированное множество"""
+        self.assertEqual(
+            follow_graph.is_following(self.user, [self.author, self.other]),
+            {self.author.pk: False, self.other.pk: False})
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follow_graph.is_following(
+                    self.user, [self.author.pk, self.other.pk]),
+                {self.author.pk: True, self.other.pk: False})
+        follow.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.following_count(self.user), 0)
+
+    def test_group_marks_followed_authors(self):
+        Post.objects.create(
+            author=self.author, group=self.group, text='Пост кумира')
+        url = reverse('posts:slug', args=[self.group.slug])
+        response = self.authorized_client.get(url)
+        self.assertNotContains(response, '(вы подписаны)')
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, '(вы подписаны)')
+
+
+class TestFollows(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(3)]
+        cls.authors = [
+            User.objects.create_user(username=f'writer{i}') for i in range(2)]
+        cls.group = Group.objects.create(
+            title='Группа', slug='writers', description='Описание')
+        for author in cls.authors:
+            Post.objects.create(
+                author=author, group=cls.group, text=f'Пост {author}')
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_stats_consistent(self):
+        call_command('rebuild_author_stats', '--check', stdout=StringIO())
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка и отписка ничего не меняют"""
+        reader, author = self.readers[0], self.authors[0]
+        self.assertTrue(follows.follow(reader, author))
+        self.assertFalse(follows.follow(reader, author))
+        self.assertFalse(follows.follow(reader, reader))
+        self.assertEqual(Follow.objects.filter(user=reader).count(), 1)
+        self.assert_stats_consistent()
+        self.assertTrue(follows.unfollow(reader, author))
+        self.assertFalse(follows.unfollow(reader, author))
+        self.assert_stats_consistent()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=reader).exists())
+
+    def test_follow_and_unfollow_many(self):
+        """Массовые подписки пропускают повторы и досчитывают производные"""
+        reader = self.readers[0]
+        self.assertEqual(follow_graph.following_count(reader), 0)
+        Follow.objects.create(user=reader, author=self.authors[0])
+        pairs = [
+            (user.pk, author.pk)
+            for user in self.readers for author in self.authors
+        ]
+        follows.follow_many(pairs + pairs[:2] + [(reader.pk, reader.pk)])
+        self.assertEqual(Follow.objects.count(), 6)
+        self.assert_stats_consistent()
+        self.assertEqual(follow_graph.following_count(reader), 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user__in=self.readers).count(), 6)
+        follows.unfollow_many(pairs[:4])
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assert_stats_consistent()
+        self.assertEqual(follow_graph.following_count(reader), 0)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user__in=self.readers).count(), 2)
+
+    def test_repeated_follow_many_is_cheap(self):
+        """Повторная массовая подписка не досчитывает производные данные
+        и не сбрасывает кэш профилей.
+        """
+        pairs = [(self.readers[0].pk, author.pk) for author in self.authors]
+        follows.follow_many(pairs)
+        tags = [page_cache.profile_tag(author.username)
+                for author in self.authors]
+        version = page_cache.page_version(tags)
+        with CaptureQueriesContext(connection) as captured:
+            follows.follow_many(pairs)
+            follows.unfollow_many([(self.readers[1].pk, self.authors[0].pk)])
+        statements = [
+            query['sql'].split()[0] for query in captured
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertEqual(statements, ['SELECT', 'SELECT'])
+        self.assertEqual(page_cache.page_version(tags), version)
+
+    def test_group_follow(self):
+        """Подписка на всех авторов группы"""
+        client = Client()
+        client.force_login(self.readers[1])
+        url = reverse('posts:group_follow', args=[self.group.slug])
+        self.assertEqual(client.get(url).status_code, 405)
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(self.readers[1])
+        self.assertTemplateUsed(csrf_client.post(url), 'core/403csrf.html')
+        self.assertFalse(Follow.objects.filter(user=self.readers[1]).exists())
+        response = client.post(url)
+        self.assertRedirects(
+            response, reverse('posts:slug', args=[self.group.slug]))
+        self.assertEqual(
+            set(Follow.objects.filter(user=self.readers[1])
+                .values_list('author', flat=True)),
+            {author.pk for author in self.authors}
+        )
+
+
+class TestSearch(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Ёжик в тумане')
+        cls.other = Post.objects.create(
+            author=cls.user, text='Лошадка тоже в тумане')
+        Comment.objects.create(
+            post=cls.other, author=cls.user, text='Где ёжик?')
+
+    def found(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return response.context['posts'], response.context['next_cursor']
+
+    def test_search_posts_and_comments(self):
+        """Поиск находит посты по тексту поста и комментариев"""
+        posts, _ = self.found('ежик')
+        self.assertCountEqual(posts, [self.post, self.other])
+        posts, _ = self.found('где ёжик')
+        self.assertEqual(posts, [self.other])
+
+    def test_search_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении поста"""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Медвежонок'
+        post.save()
+        self.assertEqual(self.found('медвежонок')[0], [post])
+        self.assertEqual(self.found('тумане')[0], [self.other])
+        Post.objects.get(pk=self.other.pk).delete()
+        self.assertEqual(self.found('ёжик')[0], [])
+
+    def test_search_cursor(self):
+        """Результаты поиска листаются курсором"""
+        for i in range(12):
+            Post.objects.create(author=self.user, text=f'Туман номер {i}')
+        first, cursor = self.found('туман')
+        self.assertEqual(len(first), 10)
+        second, last_cursor = self.found('туман', cursor=cursor)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last_cursor)
+        self.assertFalse(set(first) & set(second))
+
+    def test_search_cursor_skips_shown_posts(self):
+        """Пост с несколькими совпавшими комментариями попадает в
+        выдачу один раз, на странице своего лучшего документа.
+        """
+        if not search.available():
+            return
+        posts = []
+        for i in range(5):
+            post = Post.objects.create(author=self.user, text=f'Пост {i}')
+            for j in range(i % 3 + 1):
+                Comment.objects.create(
+                    post=post, author=self.user,
+                    text='туман ' * (j + 1) + 'утром')
+            posts.append(post)
+        found, cursor = [], None
+        while True:
+            page, cursor = search.search('туман', cursor, limit=2)
+            found += page
+            if cursor is None:
+                break
+        self.assertEqual(len(found), len(set(found)))
+        self.assertCountEqual(found, posts)
+
+    def test_search_ranks_newest_candidates(self):
+        """Ранжируются только CANDIDATES самых новых совпадений"""
+        if not search.available():
+            return
+        newest = Post.objects.create(author=self.user, text='Ёжик')
+        with mock.patch('posts.search.CANDIDATES', 2):
+            posts, cursor = search.search('ёжик')
+        self.assertCountEqual(posts, [newest, self.other])
+        self.assertIsNone(cursor)
+
+    def test_search_syntax_is_escaped(self):
+        """Символы синтаксиса FTS в запросе не ломают поиск"""
+        posts, _ = self.found('тумане" (*')
+        self.assertCountEqual(posts, [self.post, self.other])
@@ -0,0 +1,314 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+
+from posts.models import AuthorStats, Follow, Post, TimelineEntry
+from posts.paginators import NEXT, CursorPaginator, seek
+
+logger = logging.getLogger(__name__)
+
+# Замок на время перевода автора из популярных: второй перевод того же
+# автора не ставится в очередь, а новые подписки заполняют ленту сами.
+DEMOTION_TIMEOUT = 60 * 60
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TIMELINE_WORKERS)
+    return _executor
+
+
+def is_celebrity(author_id):
+    """Посты авторов с большим числом подписчиков не раскладываются."""
+    return AuthorStats.objects.filter(
+        author_id=author_id, celebrity=True).exists()
+
+
+def demotion_key(author_id):
+    return f'posts:demoting:{author_id}'
+
+
+def promote(author_ids=None):
+    """Отмечает популярными авторов, у которых подписчиков больше
+    TIMELINE_FANOUT_LIMIT: их новые посты подмешиваются в ленты при
+    чтении, а не раскладываются по ним.
+    """
+    stats = AuthorStats.objects.filter(
+        celebrity=False,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    )
+    if author_ids is not None:
+        stats = stats.filter(author_id__in=set(author_ids) - {None})
+    stats.update(celebrity=True)
+
+
+def demote(author_ids=None):
+    """Ставит в очередь перевод из популярных авторов, у которых
+    подписчиков стало меньше TIMELINE_DEMOTE_LIMIT.
+
+    Порог ниже TIMELINE_FANOUT_LIMIT, чтобы автор на границе не
+    переводился туда и обратно на каждой подписке и отписке. Ленты всех
+    подписчиков заполняются в фоне (при TIMELINE_WORKERS = 0 — сразу);
+    пока этого не случилось, посты автора подмешиваются при чтении.
+    """
+    stats = AuthorStats.objects.filter(
+        celebrity=True,
+        followers_count__lt=settings.TIMELINE_DEMOTE_LIMIT
+    )
+    if author_ids is not None:
+        stats = stats.filter(author_id__in=set(author_ids) - {None})
+    for author_id in stats.values_list('author_id', flat=True):
+        if not cache.add(demotion_key(author_id), True, DEMOTION_TIMEOUT):
+            continue
+        if not settings.TIMELINE_WORKERS:
+            _demote(author_id)
+        else:
+            transaction.on_commit(partial(
+                get_executor().submit, _demote_in_background, author_id))
+
+
+def _demote(author_id):
+    """Раскладывает посты автора по лентам и только потом снимает
+    отметку популярности, чтобы посты не пропадали из лент между
+    этими шагами.
+    """
+    try:
+        last_post = Post.objects.filter(author_id=author_id).aggregate(
+            last=Max('pk'))['last'] or 0
+        _fill([author_id])
+        demoted = AuthorStats.objects.filter(
+            author_id=author_id,
+            celebrity=True,
+            followers_count__lt=settings.TIMELINE_DEMOTE_LIMIT
+        ).update(celebrity=False)
+        if demoted:
+            # Посты, опубликованные во время заполнения, fan_out
+            # пропустил: автор ещё был отмечен популярным.
+            _fill([author_id], newer_than=last_post)
+    finally:
+        cache.delete(demotion_key(author_id))
+
+
+def _demote_in_background(author_id):
+    try:
+        _demote(author_id)
+    except Exception:
+        logger.exception(
+            'Не удалось разложить посты автора %s по лентам', author_id)
+    finally:
+        connection.close()
+
+
+def trim(user_ids):
+    """Оставляет в лентах пользователей не больше TIMELINE_MAX_ENTRIES.
+
+    Порог считается один раз на переполненную ленту: подзапрос с
+    OFFSET на каждую строку проходил бы по тысяче записей индекса.
+    """
+    limit = settings.TIMELINE_MAX_ENTRIES
+    overflowing = TimelineEntry.objects.filter(
+        user__in=user_ids
+    ).order_by().values('user').annotate(
+        total=Count('pk')
+    ).filter(total__gt=limit).values_list('user', flat=True)
+    for user_id in overflowing:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        cutoff = entries.order_by('-pub_date', '-post_id').values_list(
+            'pub_date', flat=True)[limit - 1]
+        entries.filter(pub_date__lt=cutoff).delete()
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if post.author_id is None or is_celebrity(post.author_id):
+        return
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id, user__isnull=False
+    ).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers
+        ],
+        ignore_conflicts=True
+    )
+    trim(followers)
+
+
+def withdraw(post):
+    """Убирает пост из всех лент, например при смене автора."""
+    TimelineEntry.objects.filter(post=post).delete()
+
+
+def follow(user_id, author_id):
+    """Заполняет ленту подписчика последними постами нового автора.
+
+    Для автора, которого сейчас переводят из популярных, лента
+    заполняется всё равно: фоновое заполнение могло уже прочитать
+    список подписчиков без этой подписки.
+    """
+    if is_celebrity(author_id) and not cache.get(demotion_key(author_id)):
+        return
+    latest = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_MAX_ENTRIES]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in latest
+        ],
+        ignore_conflicts=True
+    )
+    trim([user_id])
+
+
+def unfollow(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def unfollow_many(pairs):
+    """Убирает авторов из лент по парам (подписчик, автор) одним DELETE."""
+    condition = Q()
+    for user_id, author_id in pairs:
+        condition |= Q(user_id=user_id, author_id=author_id)
+    if condition:
+        TimelineEntry.objects.filter(condition).delete()
+
+
+FILL_CHUNK = 500
+
+
+def fill(author_ids, user_ids=None):
+    """Раскладывает последние посты авторов по лентам всех их
+    подписчиков (или только подписчиков из user_ids), как если бы
+    каждая подписка была оформлена заново.
+
+    Нужна после массовой загрузки через bulk_create, который не
+    отправляет сигналов: один INSERT ... SELECT на пачку авторов вместо
+    follow() на каждую пару подписчик — автор. Популярные авторы
+    пропускаются.
+    """
+    celebrities = set(AuthorStats.objects.filter(
+        celebrity=True).values_list('author_id', flat=True))
+    _fill(set(author_ids) - celebrities, user_ids)
+
+
+def _fill(author_ids, user_ids=None, newer_than=None):
+    author_ids = sorted(set(author_ids) - {None})
+    quote = connection.ops.quote_name
+    sql = (
+        '{insert} {timeline} (user_id, post_id, author_id, pub_date) '
+        'SELECT user_id, post_id, author_id, pub_date FROM ('
+        'SELECT follow.user_id, post.id AS post_id, post.author_id, '
+        'post.pub_date, ROW_NUMBER() OVER ('
+        'PARTITION BY follow.user_id '
+        'ORDER BY post.pub_date DESC, post.id DESC) AS position '
+        'FROM {follow} follow JOIN {post} post '
+        'ON post.author_id = follow.author_id '
+        'WHERE follow.author_id IN ({authors}) {users}'
+        'AND follow.user_id IS NOT NULL {posts}'
+        ') ranked WHERE position <= %s {suffix}'
+    )
+    users, users_sql = [], ''
+    posts, posts_sql = [], ''
+    if newer_than is not None:
+        posts, posts_sql = [newer_than], 'AND post.id > %s'
+    if user_ids is not None:
+        users = sorted(set(user_ids) - {None})
+        if not users:
+            return
+        users_sql = 'AND follow.user_id IN ({}) '.format(
+            ', '.join(['%s'] * len(users)))
+    for start in range(0, len(author_ids), FILL_CHUNK):
+        chunk = author_ids[start:start + FILL_CHUNK]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.format(
+                    insert=connection.ops.insert_statement(
+                        ignore_conflicts=True),
+                    timeline=quote(TimelineEntry._meta.db_table),
+                    follow=quote(Follow._meta.db_table),
+                    post=quote(Post._meta.db_table),
+                    authors=', '.join(['%s'] * len(chunk)),
+                    users=users_sql,
+                    posts=posts_sql,
+                    suffix=connection.ops.ignore_conflicts_suffix_sql(
+                        ignore_conflicts=True),
+                ),
+                [*chunk, *users, *posts, settings.TIMELINE_MAX_ENTRIES]
+            )
+        followers = Follow.objects.filter(
+            author_id__in=chunk, user__isnull=False)
+        if users:
+            followers = followers.filter(user_id__in=users)
+        followers = list(
+            followers.values_list('user_id', flat=True).distinct())
+        for position in range(0, len(followers), FILL_CHUNK):
+            trim(followers[position:position + FILL_CHUNK])
+
+
+def timeline_posts(user):
+    """Все посты ленты подписок: записи ленты пользователя и посты
+    популярных авторов, на которых он подписан.
+
+    Страницы ленты читает TimelinePaginator по отдельности из каждого
+    источника: общий запрос по OR не может взять порядок из индекса.
+    """
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=Follow.objects.filter(
+            user=user, author__stats__celebrity=True).values('author'))
+    ).for_feed()
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок: range-чтение из TimelineEntry пользователя,
+    к которому при чтении подмешиваются посты популярных авторов.
+    """
+
+    def __init__(self, object_list, per_page, user=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+    def fetch(self, cursor, limit):
+        entries = TimelineEntry.objects.filter(
+            user=self.user).select_related('post__author', 'post__group')
+        posts = {
+            entry.post_id: entry.post
+            for entry in seek(entries, cursor, limit, pk_field='post_id')
+        }
+        celebrities = Follow.objects.filter(
+            user=self.user, author__stats__celebrity=True
+        ).values_list('author_id', flat=True)
+        # По отдельному range-чтению на автора: выборка по IN-списку
+        # авторов не может взять порядок из индекса и сортируется целиком.
+        for author_id in celebrities:
+            author_posts = Post.objects.for_feed().filter(
+                author_id=author_id)
+            for post in seek(author_posts, cursor, limit):
+                posts.setdefault(post.pk, post)
+        newest_first = cursor is None or cursor[0] == NEXT
+        return sorted(
+            posts.values(),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=newest_first
+        )[:limit]
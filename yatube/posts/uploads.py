@@ -0,0 +1,43 @@
+"""Приём загружаемых файлов с пределом размера.
+
+LimitedUploadHandler стоит первым в FILE_UPLOAD_HANDLERS: пока файл не
+больше POST_IMAGE_MAX_BYTES, куски уходят дальше стандартным
+обработчикам, а после предела больше никуда не пишутся — ни в память,
+ни во временный файл. Вместо файла форма получает OversizedUpload и
+отвечает ошибкой размера, не открывая его.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class OversizedUpload(UploadedFile):
+    """Отброшенный файл больше предела: только имя и размер."""
+
+    def __init__(self, name, content_type, size, charset,
+                 content_type_extra=None):
+        super().__init__(BytesIO(), name, content_type, size, charset,
+                         content_type_extra)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            # None не пускает кусок к следующим обработчикам.
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.received <= settings.POST_IMAGE_MAX_BYTES:
+            return None
+        return OversizedUpload(
+            self.file_name, self.content_type, self.received, self.charset,
+            self.content_type_extra)
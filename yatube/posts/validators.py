@@ -1,6 +1,40 @@
 from django import forms
+from django.conf import settings
 
 
 def validate_not_empty(value):
     if value == '':
         raise forms.ValidationError()
+
+
+def validate_file_size(upload):
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise forms.ValidationError(
+            'Файл больше %(limit)s МБ.',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+            code='file_too_large'
+        )
+
+
+def validate_image_limits(upload):
+    """Проверяет размер файла и картинки по заголовку, не декодируя её.
+
+    ImageField уже открыл файл через Pillow и положил результат в
+    upload.image, поэтому ширина и высота известны без чтения пикселей.
+    Pillow сам отказывает только вдвое большей картинке, поэтому число
+    пикселей сверяется здесь, до перекодирования.
+    """
+    validate_file_size(upload)
+    width, height = upload.image.size
+    if max(width, height) > settings.POST_IMAGE_MAX_SIDE:
+        raise forms.ValidationError(
+            'Сторона картинки больше %(limit)s пикселей.',
+            params={'limit': settings.POST_IMAGE_MAX_SIDE},
+            code='image_too_large'
+        )
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise forms.ValidationError(
+            'В картинке больше %(limit)s млн пикселей.',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+            code='too_many_pixels'
+        )
@@ -1,72 +1,98 @@
 from django.shortcuts import redirect, render, get_object_or_404
+from django.conf import settings
+from django.http import JsonResponse
 from yatube.settings import PAGE_NUM
-from posts.models import Post, Group, User, Follow
-from django.core.paginator import Paginator
+from posts.models import Comment, Post, Group, User
+from posts.paginators import CommentPaginator, get_page_obj
+from posts.feed_cache import feed_cache_context
+from posts.conditional import public_page
+from posts.author_stats import get_posts_count
+from posts.timeline import TimelinePaginator, timeline_posts
+from posts import follow_graph, follows, search as post_search
+from functools import partial
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.utils.functional import SimpleLazyObject
 from posts.forms import PostForm, CommentForm
 
 
+@public_page()
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, PAGE_NUM)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    # Страница читается при первом обращении из шаблона, то есть только
+    # когда фрагмента ленты нет в кэше.
+    page_obj = SimpleLazyObject(partial(get_page_obj, request, post_list))
     template = 'posts/index.html'
-    posts = Post.objects.all()
     context = {
-        'posts': posts,
         'page_obj': page_obj,
+        **feed_cache_context(request, 'index'),
     }
     return render(request, template, context)
 
 
+@public_page(timeline=True)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.for_feed()
     title = str(group)
     description = group.description
-    paginator = Paginator(posts, PAGE_NUM)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page_obj(request, posts)
     template = 'posts/group_list.html'
     context = {
         'description': description,
         'group': group,
-        'posts': posts,
         'page_obj': page_obj,
         'title': title,
+        'followed_authors': follow_graph.following_ids(request.user),
     }
     return render(request, template, context)
 
 
+@public_page(follows=True, timeline=True)
 def profile(request, username):
-    username = get_object_or_404(User, username=username)
-    posts = username.posts.all()
-    paginator = Paginator(posts, PAGE_NUM)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    posts_num = posts.count()
+    username = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    posts = username.posts.for_feed()
+    page_obj = get_page_obj(request, posts)
+    posts_num = get_posts_count(username)
     title = f'Профайл пользователя {username.get_full_name()}'
-    following = Follow.objects.filter(author=username).exists()
+    following = follow_graph.is_following(
+        request.user, [username])[username.pk]
     context = {
         'username': username,
         'title': title,
         'posts_num': posts_num,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        'followers_count': follow_graph.follower_count(username),
+        'following_count': follow_graph.following_count(username),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def get_comments_page(post_id, cursor):
+    comments = (
+        Comment.objects.filter(post_id=post_id)
+        .select_related('author')
+        .only('post', 'text', 'created', 'author__username')
+        .order_by('created', 'id')
+    )
+    paginator = CommentPaginator(comments, settings.COMMENT_PAGE_NUM)
+    return paginator.page_by_cursor(cursor)
+
+
+@public_page()
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts_num = post.author.posts.all().count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    posts_num = get_posts_count(post.author)
     title = str(post)
     form = CommentForm()
-    comments = post.comments.all()
+    comments = get_comments_page(post.pk, request.GET.get('comments'))
     context = {
         'post': post,
+        'post_id': post.pk,
         'posts_num': posts_num,
         'title': title,
         'form': form,
@@ -75,6 +101,29 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста: HTML-фрагмент или JSON"""
+    comments = get_comments_page(post_id, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 @csrf_exempt
 def post_create(request):
@@ -82,7 +131,6 @@ def post_create(request):
         request.POST or None,
         files=request.FILES or None
     )
-    groups = Group.objects.all()
     if form.is_valid():
         form = form.save(commit=False)
         form.author = request.user
@@ -90,7 +138,6 @@ def post_create(request):
         return redirect('posts:profile', form.author)
     context = {
         'form': form,
-        'groups': groups,
     }
     return render(request, 'posts/create_post.html', context)
 
@@ -98,8 +145,11 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    form = PostForm(request.POST or None, instance=post)
-    groups = Group.objects.all()
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        instance=post
+    )
     if form.is_valid():
         form = form.save(False)
         form.author = request.user
@@ -109,19 +159,13 @@ def post_edit(request, post_id):
         'form': form,
         'post': post,
         'is_edit': True,
-        'groups': groups,
     }
-    form = PostForm(
-        request.POST or None,
-        files=request.FILES or None,
-        instance=post
-    )
     return render(request, 'posts/create_post.html', context)
 
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -134,10 +178,15 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     title = 'Авторы, на которых подписан пользователь'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, PAGE_NUM)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = timeline_posts(request.user)
+    # Нумерованные страницы ?page=N не подмешивали бы посты популярных
+    # авторов, поэтому лента подписок только курсорная.
+    page_obj = get_page_obj(
+        request,
+        post_list,
+        paginator_class=partial(TimelinePaginator, user=request.user),
+        numbered=False
+    )
     context = {
         'title': title,
         'page_obj': page_obj,
@@ -148,18 +197,37 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     """Подписка на автора"""
-    user = get_object_or_404(User, username=request.user.username)
     author = get_object_or_404(User, username=username)
-    if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
+    follows.follow(request.user, author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     """Отписка от автора"""
-    follower = Follow.objects.filter(
-        user=request.user, author__username=username)
-    if follower.exists():
-        follower.delete()
+    author = get_object_or_404(User, username=username)
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def group_follow(request, slug):
+    """Подписка на всех авторов группы"""
+    group = get_object_or_404(Group, slug=slug)
+    follows.follow_group(request.user, group)
+    return redirect('posts:slug', slug=slug)
+
+
+def search(request):
+    """Полнотекстовый поиск по постам и комментариям"""
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = post_search.search(
+        query, request.GET.get('cursor'), PAGE_NUM)
+    context = {
+        'title': 'Поиск',
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -28,12 +29,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.PasswordHashingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -41,7 +46,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.profiling.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -103,14 +108,177 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE_NUM = 10
 
+COMMENT_PAGE_NUM = 20
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
+# Несколько воркеров на одном хосте должны работать с 'sqlite': у
+# LocMemCache кэш и сброс поколений свои в каждом процессе.
+CACHE_BACKEND = 'locmem'
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 512 * 1024 * 1024,
+        },
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+}
+
+# 'cached_db' читает сессию из кэша и идёт в БД только при промахе,
+# 'signed_cookies' хранит её в подписанной cookie и не трогает БД
+# вовсе, но выход не отзывает уже выданную cookie. 'cached_db' с
+# несколькими воркерами включается только вместе с CACHE_BACKEND =
+# 'sqlite': иначе сессия, завершённая в одном процессе, остаётся
+# в LocMemCache другого.
+SESSION_BACKEND = 'db'
+
+SESSION_BACKENDS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
 }
+
+SESSION_ENGINE = SESSION_BACKENDS[SESSION_BACKEND]
+
+# Сессия записывается, только когда её изменили (вход, выход,
+# сообщения), а не на каждый запрос вошедшего пользователя.
+SESSION_SAVE_EVERY_REQUEST = False
+
+# Новые пароли хешируются PASSWORD_HASHER, хеши остальных алгоритмов
+# проверяются и при входе перехешируются им. 'argon2' требует пакета
+# argon2-cffi, 'bcrypt_sha256' — пакета bcrypt.
+PASSWORD_HASHER = 'pbkdf2_sha256'
+
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2_sha256': 'core.hashing.PBKDF2PasswordHasher',
+    'pbkdf2_sha1': 'core.hashing.PBKDF2SHA1PasswordHasher',
+    'argon2': 'core.hashing.Argon2PasswordHasher',
+    'bcrypt_sha256': 'core.hashing.BCryptSHA256PasswordHasher',
+}
+
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items()
+    if name != PASSWORD_HASHER
+]
+
+# Хеш с другими параметрами перехешируется при следующем входе.
+PASSWORD_HASHER_OPTIONS = {
+    'pbkdf2_sha256': {'iterations': 150000},
+    'argon2': {'time_cost': 2, 'memory_cost': 19 * 1024, 'parallelism': 1},
+    'bcrypt_sha256': {'rounds': 12},
+}
+
+# Пароли хешируются в пуле из PASSWORD_HASHING_WORKERS потоков (0 — в
+# потоке запроса), ещё PASSWORD_HASHING_QUEUE хешей ждут очереди,
+# остальным запросам отвечает 503 с Retry-After в секундах.
+PASSWORD_HASHING_WORKERS = os.cpu_count() or 1
+
+PASSWORD_HASHING_QUEUE = 32
+
+PASSWORD_HASHING_RETRY_AFTER = 1
+
+FEED_CACHE_TIMEOUT = 60 * 60
+
+TIMELINE_MAX_ENTRIES = 1000
+
+# Посты автора с подписчиками больше TIMELINE_FANOUT_LIMIT не
+# раскладываются по лентам, а подмешиваются при чтении. Обратно автор
+# переводится, только когда подписчиков меньше TIMELINE_DEMOTE_LIMIT:
+# ленты подписчиков заполняются в пуле из TIMELINE_WORKERS потоков
+# (0 — в потоке запроса).
+TIMELINE_FANOUT_LIMIT = 1000
+
+TIMELINE_DEMOTE_LIMIT = 900
+
+TIMELINE_WORKERS = 1
+
+FOLLOW_GRAPH_TIMEOUT = 24 * 60 * 60
+
+RENDITION_WORKERS = 2
+
+# Файл больше POST_IMAGE_MAX_BYTES перестаёт записываться, как только
+# превысил предел, и форма отвечает ошибкой размера.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+POST_IMAGE_MAX_SIDE = 10000
+
+# Предел ширины × высоты: маленький PNG может разворачиваться в сотни
+# мегабайт пикселей. Pillow получает тот же предел в MAX_IMAGE_PIXELS.
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+
+POST_IMAGE_STORED_SIDE = 1920
+
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+
+POST_IMAGE_QUALITY = 80
+
+PUBLIC_PAGE_MAX_AGE = 0
+
+PAGE_CACHE_TIMEOUT = 5 * 60
+
+# Замеры запросов в заголовке Server-Timing и логгере core.profiling.
+# При PROFILING_SAMPLE_RATE = N > 0 в среднем один запрос из N
+# профилируется cProfile, файлы .prof сохраняются в PROFILING_DIR.
+PROFILING_ENABLED = False
+
+PROFILING_SAMPLE_RATE = 0
+
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Метрики для /metrics; файл общий для всех процессов на хосте.
+# Выключены по умолчанию: иначе каждый запуск сервера и тестов пишет
+# файл в дерево исходников.
+METRICS_ENABLED = False
+
+METRICS_PATH = os.path.join(BASE_DIR, 'metrics', 'metrics.sqlite3')
+
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Число живых сессий пересчитывается не чаще раза в столько секунд на
+# процесс, а не при каждом запросе /metrics.
+METRICS_SESSIONS_INTERVAL = 60
+
+# /metrics без входа отдаётся только этим адресам, остальным — только
+# сотрудникам (is_staff).
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Списки админки считают строки не дальше этого предела, а таблицы
+# больше него без фильтров показывают оценку числа строк.
+ADMIN_COUNT_LIMIT = 10000